@@ -1,18 +1,43 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations  # 注解不在导入时求值，fitz 才能延迟导入
 
-import os, sys, json, re, subprocess
-from typing import List, Dict, Any, Tuple, Optional
-import fitz  # PyMuPDF
-from PyQt5.QtGui import QIcon
+import time
+_T_START = time.perf_counter()  # 启动计时起点（--measure-startup）
 
-from PyQt5.QtCore import Qt, QPoint, QUrl, QObject, pyqtSignal, QThread
+import os, sys, json, re, subprocess, hashlib, argparse, glob, threading, importlib, multiprocessing, posixpath
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait as futures_wait
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator
+from PyQt5.QtGui import QIcon, QImage, QPainter, QPen, QColor
+
+from PyQt5.QtCore import Qt, QPoint, QUrl, QObject, pyqtSignal, QThread, QCoreApplication, QRectF, QTimer
 from PyQt5.QtGui import QDesktopServices
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QGridLayout, QLabel, QLineEdit, QPushButton,
     QFileDialog, QTableWidget, QTableWidgetItem, QHeaderView, QCheckBox, QTextEdit,
-    QMessageBox, QComboBox, QTabWidget, QMenu, QStyledItemDelegate, QProgressBar
+    QMessageBox, QComboBox, QTabWidget, QMenu, QStyledItemDelegate, QProgressBar, QSpinBox,
+    QVBoxLayout
 )
 
+class _LazyModule:
+    """首次访问属性时才导入模块；_load() 可在后台线程提前触发"""
+    def __init__(self, name: str):
+        self._name = name
+        self._mod = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._mod is None:
+            with self._lock:
+                if self._mod is None: self._mod = importlib.import_module(self._name)
+        return self._mod
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+fitz = _LazyModule("fitz")  # PyMuPDF：启动后在后台导入，避免拖慢窗口显示
+_T_IMPORTED = time.perf_counter()
+
 APP_TITLE = "PDF 图片工具箱"
 APP_VERSION = "v1.2.2" 
 GITHUB_URL = "https://github.com/xjhaz/pdf-image-toolbox"
@@ -21,6 +46,31 @@ GITHUB_URL = "https://github.com/xjhaz/pdf-image-toolbox"
 INCH_TO_PT = 72.0
 CM_TO_PT = INCH_TO_PT / 2.54  # ≈28.3464567
 
+Y_ORIGINS = ("从下往上（PDF 标准）", "从上往下（屏幕/GUI）")
+
+# ========= 插入方式 =========
+# overlay：在规则位置叠加新图；replace：按规则记录的 xref 原位替换原图（所有引用页同时生效）
+INSERT_MODES = {"overlay": "叠加插入", "replace": "原位替换（按 xref）"}
+
+# ========= 批处理预检 =========
+PREFLIGHT_WORKERS = 8
+PREFLIGHT_LOG_LIMIT = 50  # 每类问题最多逐条列出的数量
+PREFLIGHT_HEAD_BYTES = 64 * 1024  # 检查 PNG/JPEG 规则图片时读取的文件头
+
+# ========= 持久化图片缓存 =========
+# 预处理后的规则图片（规范化 / 可选降采样）按内容哈希缓存到磁盘，跨运行、跨进程复用
+IMAGE_CACHE_DIR = os.environ.get("PDF_TOOLBOX_CACHE") or os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache"), "pdf_image_toolbox", "images")
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# ========= 插入预览 =========
+PREVIEW_DPI = 50          # 低分辨率预览，仅用于摆放规则矩形
+PREVIEW_CACHE_PAGES = 32  # 渲染结果 LRU 缓存页数
+
+# ========= 输入预读 =========
+PREFETCH_MAX_BYTES = 256 * 1024 * 1024  # 预读缓冲总量上限（含正在处理的文件）
+PREFETCH_WORKERS = 4
+
 def resource_path(relative_path):
     """获取资源文件路径（兼容 PyInstaller 打包后运行）"""
     if hasattr(sys, '_MEIPASS'):  # 打包后
@@ -42,6 +92,13 @@ def as_float(s: str, fb: float = 0.0) -> float:
     try: return float(str(s).replace("%", "").strip())
     except: return float(fb)
 
+def as_bool(s, fb: bool = True) -> bool:
+    if isinstance(s, bool): return s
+    sv = str(s).strip().lower() if s is not None else ""
+    if sv in ("1", "true", "yes", "y", "是"): return True
+    if sv in ("0", "false", "no", "n", "否"): return False
+    return fb
+
 # ========= 路径统一（绝对 + 正斜杠） =========
 def to_posix_abs(path: str) -> str:
     if not path: return ""
@@ -57,13 +114,56 @@ def resolve_posix_from_config(base_dir: str, path_in_cfg: str) -> str:
 # ========= 通用 =========
 def ensure_dir(p: str): os.makedirs(p, exist_ok=True)
 
-def page_index(doc: fitz.Document, p: str) -> int:
+def page_index(total: int, p: str) -> int:
     sp = (str(p) if p is not None else "last").strip().lower()
-    if sp == "last": idx = len(doc) - 1
+    if sp == "last": idx = total - 1
     else:
         try: idx = int(p) - 1
-        except: idx = len(doc) - 1
-    return max(0, min(idx, len(doc)-1))
+        except: idx = total - 1
+    return max(0, min(idx, total-1))
+
+def page_set(total: int, p: str) -> List[int]:
+    """
+    规则页码 -> 0 基页号列表（total 为文档页数）：
+    - 单个数字 / last / 空：同 page_index（越界时夹到首/末页，兼容旧配置）
+    - all、odd、even、last-N（最后 N 页），以及 parse_pages 的 "1,3-5" 语法，可用逗号混写
+    - 无法识别的写法抛出 ValueError（避免拼写错误时静默不盖章）
+    """
+    sp = (str(p) if p is not None else "").strip().lower()
+    if not sp or sp == "last" or re.match(r"^\d+$", sp):
+        return [page_index(total, sp or "last")]
+    pages = set(); plain = []
+    for part in sp.split(","):
+        part = part.strip()
+        m = re.match(r"^last\s*-\s*(\d+)$", part)
+        if part == "all": pages.update(range(total))
+        elif part == "odd": pages.update(range(0, total, 2))
+        elif part == "even": pages.update(range(1, total, 2))
+        elif part == "last": pages.add(total - 1)
+        elif m and int(m.group(1)) > 0: pages.update(range(max(0, total - int(m.group(1))), total))
+        elif re.match(r"^\d+(\s*-\s*\d+)?$", part): plain.append(part)
+        elif part: raise ValueError(f"无法识别的页码：{part}")
+    if plain: pages.update(parse_pages(",".join(plain), total))
+    return sorted(p for p in pages if 0 <= p < total)
+
+def rule_rect(rule: Dict[str, Any], page_h: float, unit: str, use_pdf_origin: bool) -> fitz.Rect:
+    """按规则（单位、缩放、保持等比、Y基准）计算页面上的放置矩形（pt，左上原点）"""
+    X = as_float(rule["x"]); Y = as_float(rule["y"])
+    W = as_float(rule["width"]); H = as_float(rule["height"])
+    Sx = as_float(rule["scale_x"], 100.0); Sy = as_float(rule["scale_y"], 100.0)
+    keep_aspect = bool(rule.get("keep_aspect", True))
+    if keep_aspect:
+        s = min(Sx, Sy) / 100.0; Wf, Hf = W * s, H * s
+    else:
+        Wf, Hf = W * (Sx/100.0), H * (Sy/100.0)
+
+    x_pt = to_pt(X, unit); w_pt = to_pt(Wf, unit)
+    y_input_pt = to_pt(Y, unit); h_pt = to_pt(Hf, unit)
+    if use_pdf_origin:
+        x0 = x_pt; y0 = page_h - (y_input_pt + h_pt)
+    else:
+        x0 = x_pt; y0 = y_input_pt
+    return fitz.Rect(x0, y0, x0 + w_pt, y0 + h_pt)
 
 def parse_pages(spec: str, total: int) -> List[int]:
     if not spec or not spec.strip():
@@ -167,6 +267,861 @@ def build_pixmap_from_xref(doc: fitz.Document, xref: int) -> fitz.Pixmap:
 
     return pix
 
+def xref_image_signature(doc: fitz.Document, xref: int) -> Dict[str, Any]:
+    """图片对象的尺寸与原始流摘要；提取时记入规则，原位替换前据此确认目标仍是同一张图"""
+    try:
+        w, h = doc.xref_get_key(xref, "Width")[1], doc.xref_get_key(xref, "Height")[1]
+        digest = hashlib.sha1(doc.xref_stream_raw(xref) or b"").hexdigest()[:16]
+        return dict(xref_width=int(w), xref_height=int(h), xref_digest=digest)
+    except Exception:
+        return {}
+
+# ========= PDF 预读流水线 =========
+def _file_size(path: str) -> int:
+    try: return os.path.getsize(path)
+    except OSError: return 0
+
+def _read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+class PdfPrefetcher:
+    """
+    按顺序产出 (path, data, err)：
+    - I/O 线程池提前读取后续 PDF，读盘与盖章/保存重叠进行
+    - 在途 + 已就绪 + 正在处理的缓冲总字节数不超过 max_bytes（至少保留 1 个文件）
+    - data 为整文件 bytes，可直接交给 fitz.open(stream=...)，不再复制
+    """
+    def __init__(self, paths: Iterable[str], max_bytes: int = PREFETCH_MAX_BYTES,
+                 workers: int = PREFETCH_WORKERS):
+        self.paths = paths
+        self.max_bytes = max(1, int(max_bytes))
+        self.workers = max(1, int(workers))
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[bytes], Optional[Exception]]]:
+        it = iter(self.paths)
+        pending: deque = deque()  # (path, size, future)
+        budget = 0
+        nxt = next(it, None)
+        ex = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf-prefetch")
+        try:
+            while True:
+                while nxt is not None:
+                    sz = _file_size(nxt)
+                    if pending and budget + sz > self.max_bytes: break
+                    pending.append((nxt, sz, ex.submit(_read_file_bytes, nxt)))
+                    budget += sz
+                    nxt = next(it, None)
+                if not pending: break
+                path, sz, fut = pending.popleft()
+                try: data, err = fut.result(), None
+                except Exception as e: data, err = None, e
+                yield path, data, err
+                budget -= sz  # 调用方取下一个时，上一个缓冲才算释放
+        finally:
+            for _, _, fut in pending: fut.cancel()
+            ex.shutdown(wait=False)
+
+# ========= 目录遍历与分片 =========
+def walk_pdfs(root: str, out_root_abs: str) -> List[str]:
+    """遍历 root 下所有 PDF（排除输出目录），按路径排序保证多次运行顺序一致"""
+    pdf_list: List[str] = []
+    for dirpath, dirs, files in os.walk(root):
+        abs_dirs = [os.path.abspath(os.path.join(dirpath, d)) for d in dirs]
+        dirs[:] = sorted(d for d, absd in zip(dirs, abs_dirs)
+                         if not (absd == out_root_abs or absd.startswith(out_root_abs + os.sep)))
+        for f in sorted(files):
+            if f.lower().endswith(".pdf"):
+                pdf_list.append(os.path.join(dirpath, f))
+    return pdf_list
+
+def rel_posix(path: str, root: str) -> str:
+    return os.path.relpath(path, root).replace("\\", "/")
+
+def parse_shard(spec: str) -> Optional[Tuple[int, int]]:
+    """解析 "i/N"（i 从 1 开始）；空串返回 None"""
+    if not spec or not spec.strip(): return None
+    m = re.match(r"^\s*(\d+)\s*/\s*(\d+)\s*$", spec)
+    if not m: raise ValueError(f"分片格式应为 i/N：{spec}")
+    i, n = int(m.group(1)), int(m.group(2))
+    if n < 1 or not (1 <= i <= n): raise ValueError(f"分片序号超出范围：{spec}")
+    return i, n
+
+def shard_of(rel: str, n: int) -> int:
+    """按相对路径的稳定哈希分配分片（1..n），与机器、进程、遍历顺序无关"""
+    h = hashlib.sha1(rel.encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big") % n + 1
+
+def select_shard(pdf_list: List[str], root: str, shard: Optional[Tuple[int, int]]) -> List[str]:
+    if not shard: return pdf_list
+    i, n = shard
+    return [p for p in pdf_list if shard_of(rel_posix(p, root), n) == i]
+
+# ========= 结果清单（JSON Lines） =========
+def manifest_name(shard: Optional[Tuple[int, int]]) -> str:
+    if not shard: return "manifest.jsonl"
+    return f"manifest.shard-{shard[0]}-of-{shard[1]}.jsonl"
+
+class ManifestWriter:
+    """逐行追加 JSON 记录；每行写完即 flush，便于下游 tail"""
+    def __init__(self, path: str, kind: str = "insert"):
+        self.path = path
+        self.kind = kind
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"  # 区分同一清单中的多次运行
+        self._seq = 0
+        self._lock = threading.Lock()
+        ensure_dir(os.path.dirname(os.path.abspath(path)))
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write(self, **record):
+        with self._lock:
+            self._seq += 1
+            rec = dict(kind=self.kind, run=self.run_id, seq=self._seq, time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            rec.update(record)
+            self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._f.flush()
+
+    def close(self):
+        try: self._f.close()
+        except Exception: pass
+
+def read_manifest(path: str) -> List[Dict[str, Any]]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try: records.append(json.loads(line))
+            except ValueError: pass  # 中断写入留下的半行
+    return records
+
+def merge_manifests(paths: List[str], out_path: str) -> Dict[str, Any]:
+    """合并各分片清单：同一相对路径以后写入的记录为准（重跑覆盖），输出合并清单与汇总"""
+    latest: Dict[str, Dict[str, Any]] = {}
+    shards_seen: Dict[int, set] = {}
+    for p in paths:
+        m = re.search(r"shard-(\d+)-of-(\d+)", os.path.basename(p))
+        if m: shards_seen.setdefault(int(m.group(2)), set()).add(int(m.group(1)))
+        for rec in read_manifest(p):
+            latest[rec.get("rel") or rec.get("input", "")] = rec
+    ok = sum(1 for r in latest.values() if r.get("status") == "ok")
+    skipped = sum(1 for r in latest.values() if r.get("status") == "skipped")
+    fail = len(latest) - ok - skipped
+    with open(out_path, "w", encoding="utf-8") as f:
+        for key in sorted(latest):
+            f.write(json.dumps(latest[key], ensure_ascii=False) + "\n")
+    missing = sorted(f"{i}/{n}" for n, got in shards_seen.items() for i in range(1, n + 1) if i not in got)
+    return dict(total=len(latest), ok=ok, fail=fail, skipped=skipped, missing_shards=missing,
+                output=to_posix_abs(out_path))
+
+# ========= 逐文件图片清单（邮件合并式盖章） =========
+RULE_KEYS = ("x", "y", "width", "height", "scale_x", "scale_y", "page", "keep_aspect")
+
+def _norm_rel(p: str) -> str:
+    """清单中的 PDF 路径 -> 规范化的相对路径（与 rel_posix 的结果一致）；绝对路径或跳出处理目录时抛出 ValueError"""
+    p = str(p).strip().replace("\\", "/")
+    if not p: return ""
+    if p.startswith("/") or re.match(r"^[A-Za-z]:", p): raise ValueError(f"pdf 需为相对处理目录的路径：{p}")
+    n = posixpath.normpath(p)
+    if n == ".." or n.startswith("../"): raise ValueError(f"pdf 路径超出处理目录：{p}")
+    return n
+
+def load_stamp_jobs(fn: str, base_rules: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    读取逐文件清单（.csv 或 .jsonl），返回 {PDF相对路径: 该文件的规则列表}：
+    - 每行至少含 pdf（相对处理目录）；image 及 RULE_KEYS 中的非空字段覆盖基础规则
+    - JSONL 行可直接给出 rules 列表，完全替代基础规则（每条需给出 image/width/height，其余取默认值）
+    - 没有基础规则时，每行自身即一条规则（需给出 width/height）
+    - 同一 pdf 出现多行时规则依次累加
+    - 图片路径按清单文件所在目录解析
+    """
+    base_dir = os.path.dirname(os.path.abspath(fn))
+    if fn.lower().endswith(".csv"):
+        import csv
+        with open(fn, "r", encoding="utf-8-sig", newline="") as f:
+            rows = [dict(r) for r in csv.DictReader(f)]
+    else:
+        rows = []
+        with open(fn, "r", encoding="utf-8") as f:
+            for n, line in enumerate(f, start=1):
+                if not line.strip(): continue
+                try: rows.append(json.loads(line))
+                except ValueError as e: raise ValueError(f"第{n}行 JSON 无效：{e}")
+
+    def fix_image(r: Dict[str, Any]) -> Dict[str, Any]:
+        r = dict(r); r["image"] = resolve_posix_from_config(base_dir, r.get("image", "")); return r
+
+    defaults = dict(x=0.0, y=0.0, scale_x=100.0, scale_y=100.0, page="last", keep_aspect=True)
+    jobs: Dict[str, List[Dict[str, Any]]] = {}
+    for n, row in enumerate(rows, start=1):
+        try: rel = _norm_rel(row.get("pdf") or "")
+        except ValueError as e: raise ValueError(f"第{n}行：{e}")
+        if not rel: raise ValueError(f"第{n}行缺少 pdf 字段")
+        if isinstance(row.get("rules"), list):
+            rules = []
+            for r in row["rules"]:
+                if not isinstance(r, dict) or any(r.get(k) in (None, "") for k in ("image", "width", "height")):
+                    raise ValueError(f"第{n}行：rules 中每条规则需给出 image/width/height")
+                r = dict(defaults, **{k: v for k, v in r.items() if v not in (None, "")})
+                r["keep_aspect"] = as_bool(r["keep_aspect"])
+                rules.append(fix_image(r))
+        else:
+            over = {k: row[k] for k in RULE_KEYS if row.get(k) not in (None, "")}
+            if "keep_aspect" in over: over["keep_aspect"] = as_bool(over["keep_aspect"])
+            if row.get("image"): over["image"] = row["image"]
+            if base_rules:
+                rules = [dict(r, **over) for r in base_rules]
+            else:
+                if "width" not in over or "height" not in over or "image" not in over:
+                    raise ValueError(f"第{n}行：无基础规则时需给出 image/width/height")
+                rules = [dict(defaults, **over)]
+            rules = [fix_image(r) if "image" in over else r for r in rules]
+        jobs.setdefault(rel, []).extend(rules)
+    return jobs
+
+# ========= 图片预处理与持久化缓存 =========
+def image_header(raw: bytes) -> Optional[Tuple[int, int, int]]:
+    """只读文件头取 PNG/JPEG 的 (宽, 高, 颜色分量数)，不解码；其他格式或无法识别时返回 None"""
+    if raw[:8] == b"\x89PNG\r\n\x1a\n" and raw[12:16] == b"IHDR":
+        return int.from_bytes(raw[16:20], "big"), int.from_bytes(raw[20:24], "big"), 3  # PNG 没有 CMYK
+    if raw[:3] != b"\xff\xd8\xff": return None
+    i = 2
+    while i + 9 < len(raw):
+        if raw[i] != 0xFF: return None
+        m = raw[i + 1]
+        if m == 0xFF: i += 1; continue               # 填充字节
+        if m == 0x01 or 0xD0 <= m <= 0xD9: i += 2; continue  # 无长度的标记
+        seg = int.from_bytes(raw[i + 2:i + 4], "big")
+        if 0xC0 <= m <= 0xCF and m not in (0xC4, 0xC8, 0xCC):  # SOFn
+            return int.from_bytes(raw[i + 7:i + 9], "big"), int.from_bytes(raw[i + 5:i + 7], "big"), raw[i + 9]
+        i += 2 + seg
+    return None
+
+def image_needs_prepare(raw: bytes, max_px: int = 0) -> bool:
+    """PNG/非 CMYK JPEG 且无需降采样时可原样嵌入，不必解码，也不进磁盘缓存"""
+    hdr = image_header(raw)
+    if hdr is None or hdr[2] == 4: return True
+    return bool(max_px) and max(hdr[0], hdr[1]) > max_px
+
+def prepare_image(raw: bytes, max_px: int = 0) -> bytes:
+    """
+    规范化为可直接嵌入的图片字节：
+    - PNG/非 CMYK JPEG 且无需降采样：原样返回（只读文件头判断，不解码、不重新编码）
+    - 其他格式（BMP/TIFF 等）或 CMYK JPEG：转为 RGB 后编码（JPEG 仍存 JPEG，其余存 PNG）
+    - max_px > 0 且长边超出：等比缩小，原图为不透明 JPEG 时仍存 JPEG
+    """
+    if not image_needs_prepare(raw, max_px): return raw
+    is_jpeg = raw[:3] == b"\xff\xd8\xff"
+    pix = fitz.Pixmap(raw)
+    scale = (max_px / max(pix.width, pix.height)) if max_px and max(pix.width, pix.height) > max_px else 1.0
+    if pix.colorspace is not None and pix.colorspace.n == 4:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if scale < 1.0:
+        pix = fitz.Pixmap(pix, max(1, round(pix.width * scale)), max(1, round(pix.height * scale)), None)
+    if is_jpeg and not pix.alpha:
+        return pix.tobytes("jpg", jpg_quality=90)
+    return pix.tobytes("png")
+
+class DiskImageCache:
+    """
+    内容寻址的磁盘缓存：键 = sha256(源文件内容 + 预处理参数)
+    - 写入先落临时文件再 os.replace，多进程并发读写安全
+    - 命中时刷新 mtime，evict() 按 mtime 从旧到新删除，直到总量低于上限的 90%
+    """
+    def __init__(self, root: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+
+    @staticmethod
+    def key(raw: bytes, params: Dict[str, Any]) -> str:
+        h = hashlib.sha256(raw)
+        h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".img")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = _read_file_bytes(path)
+            os.utime(path, None)
+            return data
+        except OSError:
+            return None  # 未命中，或被其他进程淘汰
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        try:
+            ensure_dir(os.path.dirname(path))
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # 缓存不可写时不影响处理
+
+    def evict(self):
+        entries = []
+        for dirpath, _dirs, files in os.walk(self.root):
+            for fn in files:
+                fp = os.path.join(dirpath, fn)
+                try: st = os.stat(fp)
+                except OSError: continue
+                entries.append((st.st_mtime, st.st_size, fp))
+        total = sum(e[1] for e in entries)
+        if total <= self.max_bytes: return
+        for _mtime, size, fp in sorted(entries):
+            if total <= self.max_bytes * 0.9: break
+            try: os.remove(fp); total -= size
+            except OSError: pass
+
+# ========= 图片读取缓存（整批共享） =========
+class ImageCache:
+    """
+    按路径缓存预处理后的图片字节，同一批次中多个 PDF 使用同一图片时只读一次；
+    disk 不为空且图片确需预处理（格式转换/CMYK/降采样）时，结果再按内容哈希存入磁盘缓存，后续运行和其他进程直接复用
+    """
+    def __init__(self, max_px: int = 0, disk: Optional[DiskImageCache] = None):
+        self.max_px = max(0, int(max_px))
+        self.disk = disk
+        self._data: Dict[str, bytes] = {}
+
+    def get(self, path: str) -> bytes:
+        key = to_posix_abs(path)
+        data = self._data.get(key)
+        if data is None:
+            raw = _read_file_bytes(path)
+            if not image_needs_prepare(raw, self.max_px):
+                data = raw  # 可原样嵌入：不解码、不计算哈希，也不在磁盘缓存中存副本
+            elif self.disk is None:
+                data = prepare_image(raw, self.max_px)
+            else:
+                dkey = self.disk.key(raw, dict(v=1, max_px=self.max_px))
+                data = self.disk.get(dkey)
+                if data is None:
+                    data = prepare_image(raw, self.max_px)
+                    self.disk.put(dkey, data)
+            self._data[key] = data
+        return data
+
+    def close(self):
+        self._data.clear()
+        if self.disk is not None:
+            try: self.disk.evict()
+            except Exception: pass
+
+# ========= 矢量 PDF 源（印章/签名） =========
+def is_pdf_source(path: str) -> bool:
+    return str(path).lower().endswith(".pdf")
+
+class SourcePdfCache:
+    """
+    矢量源 PDF 整批只打开一次：show_pdf_page 以源文档对象区分来源，
+    同一源页在每个目标文档中只生成一个 Form XObject，其余放置均引用它
+    """
+    def __init__(self):
+        self._docs: Dict[str, fitz.Document] = {}
+
+    def get(self, path: str) -> fitz.Document:
+        key = to_posix_abs(path)
+        doc = self._docs.get(key)
+        if doc is None:
+            doc = fitz.open(path)
+            if doc.is_encrypted and not doc.authenticate(""):
+                doc.close(); raise ValueError(f"源 PDF 已加密：{path}")
+            self._docs[key] = doc
+        return doc
+
+    def close(self):
+        for doc in self._docs.values():
+            try: doc.close()
+            except Exception: pass
+        self._docs.clear()
+
+# ========= 批处理预检 =========
+def check_image_source(path: str) -> str:
+    """检查规则图片（PNG/JPEG 只读文件头；其他格式解码；矢量源检查能否打开）；正常返回空串，否则返回问题描述"""
+    if not path or not os.path.isfile(path): return "文件不存在"
+    try:
+        if is_pdf_source(path):
+            src = fitz.open(path)
+            try:
+                if src.is_encrypted and not src.authenticate(""): return "源 PDF 已加密"
+                if src.page_count < 1: return "源 PDF 没有页面"
+            finally:
+                src.close()
+        else:
+            with open(path, "rb") as f: head = f.read(PREFLIGHT_HEAD_BYTES)
+            hdr = image_header(head)
+            if hdr is not None:
+                if hdr[0] <= 0 or hdr[1] <= 0: return "图片尺寸无效"
+                return ""
+            pix = fitz.Pixmap(path)
+            if pix.width <= 0 or pix.height <= 0: return "图片尺寸无效"
+    except Exception as e:
+        return f"无法解码：{e}"
+    return ""
+
+def rule_page_warnings(n: int, rules: List[Dict[str, Any]]) -> Tuple[List[str], int]:
+    """按页数 n 校验各规则页码，返回 (提示列表, 放置次数)；页码写法无法识别时抛出 ValueError"""
+    warnings: List[str] = []; placements = 0
+    for i, rule in enumerate(rules, start=1):
+        spec = str(rule.get("page", "last")).strip()
+        if re.match(r"^\d+$", spec) and not (1 <= int(spec) <= n):
+            warnings.append(f"规则{i}：第{spec}页超出范围（共{n}页），将落在{'末' if int(spec) > n else '首'}页")
+        try: pnos = page_set(n, spec)
+        except ValueError as e: raise ValueError(f"规则{i}：{e}")
+        if not pnos: warnings.append(f"规则{i}：页码“{spec}”在本文件中没有对应页")
+        placements += len(pnos)
+    return warnings, placements
+
+def check_pdf(path: str, rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    只解析文件结构（xref/trailer/页树，不读全部正文）：检查能否打开、能否解密、页数，并按页数校验各规则页码
+    在预检进程中执行，返回可 pickle 的结果
+    """
+    res = dict(path=path, error="", error_class="", pages=0, placements=0, bytes=_file_size(path), warnings=[])
+    try:
+        doc = fitz.open(path)
+    except Exception as e:
+        res.update(error=f"无法打开：{e}", error_class=type(e).__name__); return res
+    try:
+        if doc.is_encrypted:
+            try: ok = doc.authenticate("")
+            except Exception: ok = False
+            if not ok: res.update(error="加密且无法解密", error_class="EncryptedPDF"); return res
+        n = res["pages"] = doc.page_count
+        if n < 1: res.update(error="没有页面", error_class="EmptyPDF"); return res
+        if not rules: res.update(error="没有适用的规则", error_class="NoRules"); return res
+        try: res["warnings"], res["placements"] = rule_page_warnings(n, rules)
+        except ValueError as e: res.update(error=str(e), error_class="PageSpecError")
+    finally:
+        doc.close()
+    return res
+
+def preflight(pdf_list: List[str], rules_for, workers: int = PREFLIGHT_WORKERS,
+              progress=None) -> Dict[str, Any]:
+    """
+    预检：每个规则图片只检查一次（当前线程）；各 PDF 在进程池中用 check_pdf 解析结构
+    （PyMuPDF 不支持多线程并发，进程池中每个进程各自使用）
+    返回 dict(files, bad_files, bad_images, pages, placements, bytes)
+    """
+    images: Dict[str, None] = {}
+    for pdf in pdf_list:
+        for rule in rules_for(pdf): images.setdefault(rule["image"], None)
+    bad_images = {img: msg for img, msg in ((img, check_image_source(img)) for img in images) if msg}
+
+    files = []
+    if len(pdf_list) > 1:
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, os.cpu_count() or 1, len(pdf_list))),
+                                 mp_context=multiprocessing.get_context("spawn")) as ex:
+            file_futs = [ex.submit(check_pdf, pdf, rules_for(pdf)) for pdf in pdf_list]
+            for i, fut in enumerate(file_futs, start=1):
+                files.append(fut.result())
+                if progress: progress(i)
+    else:
+        for i, pdf in enumerate(pdf_list, start=1):
+            files.append(check_pdf(pdf, rules_for(pdf)))
+            if progress: progress(i)
+    good = [f for f in files if not f["error"]]
+    return dict(files=files, bad_files=[f for f in files if f["error"]], bad_images=bad_images,
+                pages=sum(f["pages"] for f in good), placements=sum(f["placements"] for f in good),
+                bytes=sum(f["bytes"] for f in good))
+
+def format_preflight(rep: Dict[str, Any]) -> List[str]:
+    lines = [f"=== 预检：{len(rep['files'])} 个 PDF，可处理 {len(rep['files']) - len(rep['bad_files'])} 个 ==="]
+    def capped(items: List[str]):
+        lines.extend(items[:PREFLIGHT_LOG_LIMIT])
+        if len(items) > PREFLIGHT_LOG_LIMIT: lines.append(f"  …另有 {len(items) - PREFLIGHT_LOG_LIMIT} 条")
+    capped([f"⛔ 图片不可用：{img} -> {msg}" for img, msg in rep["bad_images"].items()])
+    capped([f"⚠️ {f['path']} -> {f['error']}" for f in rep["bad_files"]])
+    capped([f"⚠️ {f['path']}：{w}" for f in rep["files"] for w in f["warnings"]])
+    lines.append(f"预计工作量：{rep['placements']} 次放置，涉及 {rep['pages']} 页，"
+                 f"读入 {rep['bytes'] / 1024 / 1024:.1f} MB")
+    return lines
+
+# ========= 提取：输出格式与编码线程池 =========
+# 格式键 -> (Pillow 格式名, 扩展名, 界面名称, 质量参数范围, 默认值)
+# png 的“质量”为 zlib 压缩级别 0-9；jpeg/webp 为 quality 1-100；无损 webp 为压缩力度 0-100
+EXPORT_FORMATS = {
+    "png":           ("PNG",  ".png",  "PNG（无损）",  (0, 9),   6),
+    "jpeg":          ("JPEG", ".jpg",  "JPEG（有损）", (1, 100), 90),
+    "webp":          ("WEBP", ".webp", "WebP（有损）", (1, 100), 90),
+    "webp-lossless": ("WEBP", ".webp", "WebP（无损）", (0, 100), 80),
+}
+ENCODE_WORKERS = max(1, min(8, os.cpu_count() or 1))
+
+def pixmap_to_pil(pix: fitz.Pixmap):
+    """Pixmap -> PIL Image（复制像素，之后可在其他线程编码）"""
+    from PIL import Image
+    if pix.n - pix.alpha not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    mode = {(1, 0): "L", (1, 1): "LA", (3, 0): "RGB", (3, 1): "RGBA"}[(pix.n - pix.alpha, pix.alpha)]
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+def encode_image(img, path: str, fmt: str, quality: int) -> int:
+    """按格式编码并写盘，返回文件字节数；Pillow 编码时释放 GIL，可在线程池中并行"""
+    from PIL import Image
+    pil_fmt = EXPORT_FORMATS[fmt][0]
+    if fmt == "jpeg":
+        if img.mode in ("LA", "RGBA"):  # JPEG 无透明通道：合成白底
+            bg = Image.new("RGB", img.size, (255, 255, 255))
+            bg.paste(img.convert("RGBA"), mask=img.convert("RGBA").split()[-1])
+            img = bg
+        img.save(path, pil_fmt, quality=quality)
+    elif fmt.startswith("webp"):
+        if img.mode in ("L", "LA"): img = img.convert("RGBA" if img.mode == "LA" else "RGB")
+        img.save(path, pil_fmt, quality=quality, lossless=(fmt == "webp-lossless"), method=4)
+    else:
+        img.save(path, pil_fmt, compress_level=quality)
+    return os.path.getsize(path)
+
+def _encode_timed(img, path: str, fmt: str, quality: int) -> Tuple[int, float]:
+    t0 = time.perf_counter()
+    n = encode_image(img, path, fmt, quality)
+    return n, time.perf_counter() - t0
+
+# ========= 提取：扫描图片并生成配置 =========
+def page_image_items(page: fitz.Page) -> List[Tuple[int, Tuple[float,float,float,float]]]:
+    """找出本页所有图片的 xref 与矩形"""
+    items: List[Tuple[int, Tuple[float,float,float,float]]] = []
+    used_new = False
+    if hasattr(page, "get_image_info"):
+        try:
+            infos = page.get_image_info(xrefs=True); used_new = True
+            for info in infos:
+                rt = rect_tuple_from_bbox(info.get("bbox"))
+                xref = info.get("xref") or info.get("image") or info.get("xref0")
+                if rt and xref: items.append((int(xref), rt))
+        except Exception:
+            used_new = False
+    if not used_new:
+        for img in page.get_images(full=True):
+            xref = img[0]
+            rects = []
+            try: rects = page.get_image_rects(xref)
+            except Exception: rects = []
+            for rr in rects:
+                rt = rect_tuple_from_bbox(rr)
+                if rt: items.append((xref, rt))
+    return items
+
+def rect_to_rule(rect: Tuple[float,float,float,float], page_h: float, unit: str,
+                 use_pdf_origin: bool, **extra) -> Dict[str, Any]:
+    """页面矩形（pt，左上原点）-> 插入规则坐标（单位换算；按 Y 基准）"""
+    x0, y0, x1, y1 = rect
+    if use_pdf_origin:
+        Y_unit = pt_to_unit(page_h - y1, unit)  # 左下原点 → 从下往上量
+    else:
+        Y_unit = pt_to_unit(y0, unit)
+    rule = dict(
+        x=round(pt_to_unit(x0, unit), 4),
+        y=round(Y_unit, 4),
+        width=round(pt_to_unit(x1 - x0, unit), 4),
+        height=round(pt_to_unit(y1 - y0, unit), 4),
+        scale_x=100.0,
+        scale_y=100.0,
+        keep_aspect=True,
+        unit=unit,
+    )
+    rule.update(extra)
+    return rule
+
+def write_extract_config(json_path: str, unit: str, use_pdf_origin: bool, rules: List[Dict[str, Any]]) -> str:
+    cfg = dict(
+        version=APP_VERSION,
+        unit=unit,
+        add_suffix=False,   # 提取配置默认不加后缀
+        output_dir="",      # 导出的插入配置不强制指定输出目录
+        insert_mode="overlay",
+        y_origin=Y_ORIGINS[0] if use_pdf_origin else Y_ORIGINS[1],
+        rules=rules,
+    )
+    try:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(cfg, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        raise ValueError(f"写入 JSON 失败：{e}")
+    return json_path
+
+def extract_images(pdf_path: str, out_root: str, unit: str = "cm", use_pdf_origin: bool = True,
+                   pages_spec: str = "", flatten: bool = False, fmt: str = "png",
+                   quality: Optional[int] = None, log=print, workers: int = ENCODE_WORKERS,
+                   manifest_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    导出 PDF 内嵌图片并生成 <PDF名>_config.json：
+    主线程解码下一张图片的同时，编码线程池对已解码的图片压缩写盘
+    每张图片的结果写入 manifest_path（默认 <导出根目录>/<PDF名>_manifest.jsonl，传空串不写）
+    返回 dict(rules, count, bytes, json_path, manifest_path)；无法打开/解密/写配置时抛出异常
+    """
+    if fmt not in EXPORT_FORMATS: raise ValueError(f"不支持的导出格式：{fmt}")
+    _, ext, fmt_label, (q_lo, q_hi), q_def = EXPORT_FORMATS[fmt]
+    quality = q_def if quality is None else max(q_lo, min(int(quality), q_hi))
+    ensure_dir(out_root)
+
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception as e:
+        raise ValueError(f"无法打开PDF：{e}")
+
+    mf: Optional[ManifestWriter] = None
+    try:
+        if doc.is_encrypted:
+            try: ok = doc.authenticate("")
+            except Exception: ok = False
+            if not ok: raise ValueError("PDF 已加密且无法解密。")
+
+        total = len(doc)
+        pages = parse_pages(pages_spec, total) or list(range(total))
+
+        log(f"=== 开始扫描 ===")
+        log(f"PDF：{pdf_path}")
+        log(f"导出根目录：{to_posix_abs(out_root)}")
+        log(f"单位：{unit}；Y基准：{Y_ORIGINS[0] if use_pdf_origin else Y_ORIGINS[1]}；"
+            f"格式：{fmt_label}（{quality}）；页码：{', '.join(str(p+1) for p in pages)}")
+
+        img_count = 0
+        pdf_base = os.path.splitext(os.path.basename(pdf_path))[0]
+        jobs: List[Tuple[Any, str, Dict[str, Any]]] = []  # (future, img_name, rule)，按导出顺序
+        if manifest_path is None: manifest_path = os.path.join(out_root, f"{pdf_base}_manifest.jsonl")
+        mf = ManifestWriter(manifest_path, kind="extract") if manifest_path else None
+        pdf_abs = to_posix_abs(pdf_path)
+
+        inflight: deque = deque()  # 限制已解码未编码的图片数量，控制内存
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="img-encode") as pool:
+            for pno in pages:
+                page = doc[pno]; page_h = page.rect.height
+
+                # 逐个原图导出（合成 alpha / 反相修正）；解码在主线程，编码交给线程池
+                for xref, rect in page_image_items(page):
+                    try:
+                        pix = build_pixmap_from_xref(doc, xref)
+                        if flatten and pix.alpha:
+                            pix = fitz.Pixmap(fitz.csRGB, pix)
+                        img = pixmap_to_pil(pix)
+                    except Exception as e:
+                        log(f"⚠️ 第{pno+1}页 xref={xref} 提取失败 -> {e}")
+                        if mf: mf.write(input=pdf_abs, output="", status="fail", error=str(e),
+                                        error_class=type(e).__name__, page=pno + 1, xref=xref)
+                        continue
+                    finally:
+                        pix = None
+
+                    img_count += 1
+                    img_name = f"{pdf_base}_{img_count:04d}{ext}"
+                    img_path = os.path.join(out_root, img_name)
+                    rule = rect_to_rule(rect, page_h, unit, use_pdf_origin,
+                                        page=str(pno + 1),
+                                        xref=xref,  # 供“原位替换”模式定位原图
+                                        **xref_image_signature(doc, xref))
+                    rule = dict(image=to_posix_abs(img_path), **rule)
+                    while len(inflight) >= 2 * max(1, workers):
+                        futures_wait([inflight.popleft()])
+                    fut = pool.submit(_encode_timed, img, img_path, fmt, quality); img = None
+                    inflight.append(fut)
+                    jobs.append((fut, img_name, rule))
+
+            rules: List[Dict[str, Any]] = []
+            nbytes = 0
+            for fut, img_name, rule in jobs:
+                rec = dict(input=pdf_abs, output=rule["image"], page=int(rule["page"]), xref=rule["xref"], format=fmt)
+                try:
+                    n, dt = fut.result()
+                    nbytes += n
+                except Exception as e:
+                    log(f"⚠️ 第{rule['page']}页 保存 {fmt_label} 失败：{img_name} -> {e}")
+                    if mf: mf.write(status="fail", error=str(e), error_class=type(e).__name__, **rec)
+                    continue
+                if mf: mf.write(status="ok", error="", error_class="", bytes_out=n, duration=round(dt, 4), **rec)
+                rules.append(rule)
+                log(
+                    f"第{rule['page']}页：保存 {img_name} | "
+                    f"X={rule['x']}{unit}, Y={rule['y']}{unit}, "
+                    f"W={rule['width']}{unit}, H={rule['height']}{unit}"
+                )
+    finally:
+        try: doc.close()
+        except Exception: pass
+        if mf: mf.close()
+
+    json_path = write_extract_config(os.path.join(out_root, f"{pdf_base}_config.json"), unit, use_pdf_origin, rules)
+    log(f"=== 完成：导出图片 {len(rules)} 个（{nbytes / 1024:.1f} KB） ===")
+    log(f"JSON 配置：{json_path}")
+    if mf: log(f"结果清单：{to_posix_abs(manifest_path)}")
+    return dict(rules=rules, count=len(rules), bytes=nbytes, json_path=json_path, manifest_path=manifest_path or "")
+
+# ========= 提取：区域渲染（内联图片 / 矢量图形 / 渐变） =========
+# 不是图片 XObject 的可见内容（内联图片、矢量 Logo、渐变印章）按区域裁剪渲染，不整页栅格化
+REGION_DPI = 200
+REGION_WORKERS = max(1, min(8, os.cpu_count() or 1))
+REGION_GAP_PT = 6.0      # 相距小于此值（pt）的图形合并为一个区域
+REGION_MIN_PT = 4.0      # 宽或高小于此值的单个图形（细线、分隔线）忽略
+REGION_BG_RATIO = 0.9    # 单个图形覆盖页面面积超过此比例视为背景，不参与合并
+EXTRACT_MODES = {"xobject": "内嵌图片（XObject）", "regions": "区域渲染（内联图/矢量/渐变）"}
+
+def merge_rects(rects: List[Tuple[float,float,float,float]], gap: float) -> List[Tuple[float,float,float,float]]:
+    """相交或间距 < gap 的矩形合并为外接矩形（合并后可能与其他簇相连，反复归并到稳定）"""
+    clusters: List[List[float]] = []
+    for x0, y0, x1, y1 in rects:
+        cur = [x0, y0, x1, y1]
+        while True:
+            hit = [c for c in clusters if cur[0] - gap < c[2] and c[0] < cur[2] + gap
+                   and cur[1] - gap < c[3] and c[1] < cur[3] + gap]
+            if not hit: break
+            for c in hit:
+                clusters.remove(c)
+                cur = [min(cur[0], c[0]), min(cur[1], c[1]), max(cur[2], c[2]), max(cur[3], c[3])]
+        clusters.append(cur)
+    return [tuple(c) for c in sorted(clusters, key=lambda c: (c[1], c[0]))]
+
+def page_render_regions(page: fitz.Page, gap: float = REGION_GAP_PT,
+                        min_pt: float = REGION_MIN_PT) -> List[Tuple[float,float,float,float]]:
+    """找出本页非 XObject 的可见内容区域：内联图片、矢量路径、渐变；文字与图片 XObject 不计入"""
+    pr = page.rect
+    page_area = max(pr.width * pr.height, 1.0)
+    raw: List[Tuple[float,float,float,float]] = []
+
+    def add(bbox, pad: float = 0.0):
+        rt = rect_tuple_from_bbox(bbox)
+        if not rt: return
+        r = fitz.Rect(rt[0] - pad, rt[1] - pad, rt[2] + pad, rt[3] + pad) & pr
+        # 先按单个图形过滤：细线/分隔线、整页背景都不参与合并
+        if r.is_empty or r.width < min_pt or r.height < min_pt: return
+        if r.width * r.height >= REGION_BG_RATIO * page_area: return
+        raw.append((r.x0, r.y0, r.x1, r.y1))
+
+    try:  # 内联图片：get_image_info 中 xref 为 0 的条目
+        for info in page.get_image_info(xrefs=True):
+            if not info.get("xref"): add(info.get("bbox"))
+    except Exception:
+        pass
+    # 矢量路径取 get_drawings 的几何外接框，描边再外扩半个线宽
+    # （get_bboxlog 的 stroke-path 框四周多出约 10pt，细线也会变成大区域）
+    for d in page.get_drawings():
+        stroked = "s" in (d.get("type") or "")
+        add(d.get("rect"), (d.get("width") or 0.0) / 2 if stroked else 0.0)
+    if hasattr(page, "get_bboxlog"):  # 渐变（sh）不在 get_drawings 中，取绘制日志
+        for kind, bbox in page.get_bboxlog():
+            if kind == "fill-shade": add(bbox)
+
+    return merge_rects(raw, gap)
+
+_REGION_DOC = None  # 渲染进程内各自打开的文档（进程池 initializer 设置）
+
+def _region_worker_init(pdf_path: str):
+    global _REGION_DOC
+    _REGION_DOC = fitz.open(pdf_path)
+    if _REGION_DOC.is_encrypted: _REGION_DOC.authenticate("")
+
+def _render_region_page(pno: int, out_stem: str, fmt: str, quality: int, dpi: int,
+                        flatten: bool) -> Dict[str, Any]:
+    """渲染一页中的各区域并写盘；在渲染进程中执行，返回可 pickle 的结果"""
+    page = _REGION_DOC[pno]
+    res: Dict[str, Any] = dict(page=pno, page_h=page.rect.height, regions=[])
+    for i, rect in enumerate(page_render_regions(page), 1):
+        path = f"{out_stem}_p{pno + 1:04d}_r{i:02d}{EXPORT_FORMATS[fmt][1]}"
+        t0 = time.perf_counter()
+        try:
+            pix = page.get_pixmap(clip=fitz.Rect(rect), dpi=dpi, alpha=not flatten)
+            n = encode_image(pixmap_to_pil(pix), path, fmt, quality); pix = None
+            res["regions"].append(dict(rect=rect, path=path, bytes=n, duration=time.perf_counter() - t0, error=""))
+        except Exception as e:
+            res["regions"].append(dict(rect=rect, path=path, bytes=0, duration=time.perf_counter() - t0,
+                                       error=str(e), error_class=type(e).__name__))
+    return res
+
+def extract_regions(pdf_path: str, out_root: str, unit: str = "cm", use_pdf_origin: bool = True,
+                    pages_spec: str = "", flatten: bool = False, fmt: str = "png",
+                    quality: Optional[int] = None, dpi: int = REGION_DPI, log=print,
+                    workers: int = REGION_WORKERS, manifest_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    区域渲染导出：只按 clip 渲染非 XObject 内容所在的矩形，生成 <PDF名>_regions_config.json
+    各页在进程池中并行渲染（每个进程自行打开 PDF），规则格式与 extract_images 相同（无 xref）
+    返回 dict(rules, count, bytes, json_path, manifest_path)；无法打开/解密/写配置时抛出异常
+    """
+    if fmt not in EXPORT_FORMATS: raise ValueError(f"不支持的导出格式：{fmt}")
+    _, ext, fmt_label, (q_lo, q_hi), q_def = EXPORT_FORMATS[fmt]
+    quality = q_def if quality is None else max(q_lo, min(int(quality), q_hi))
+    dpi = max(36, min(int(dpi), 1200))
+    ensure_dir(out_root)
+
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception as e:
+        raise ValueError(f"无法打开PDF：{e}")
+    try:
+        if doc.is_encrypted:
+            try: ok = doc.authenticate("")
+            except Exception: ok = False
+            if not ok: raise ValueError("PDF 已加密且无法解密。")
+        total = len(doc)
+    finally:
+        try: doc.close()
+        except Exception: pass
+    pages = parse_pages(pages_spec, total) or list(range(total))
+
+    log("=== 开始区域渲染 ===")
+    log(f"PDF：{pdf_path}")
+    log(f"导出根目录：{to_posix_abs(out_root)}")
+    log(f"单位：{unit}；Y基准：{Y_ORIGINS[0] if use_pdf_origin else Y_ORIGINS[1]}；"
+        f"格式：{fmt_label}（{quality}）；DPI：{dpi}；页码：{', '.join(str(p+1) for p in pages)}")
+
+    pdf_base = os.path.splitext(os.path.basename(pdf_path))[0]
+    out_stem = os.path.join(out_root, pdf_base)
+    if manifest_path is None: manifest_path = os.path.join(out_root, f"{pdf_base}_regions_manifest.jsonl")
+    mf = ManifestWriter(manifest_path, kind="extract") if manifest_path else None
+    pdf_abs = to_posix_abs(pdf_path)
+
+    def page_results() -> Iterator[Dict[str, Any]]:
+        args = (out_stem, fmt, quality, dpi, flatten)
+        n = max(1, min(workers, len(pages)))
+        if n == 1:  # 单页或单进程：直接在当前进程渲染
+            global _REGION_DOC
+            _region_worker_init(pdf_path)
+            try:
+                for pno in pages: yield _render_region_page(pno, *args)
+            finally:
+                _REGION_DOC.close(); _REGION_DOC = None
+            return
+        # 固定用 spawn：GUI 进程中已有其他线程，fork 出的子进程可能继承被占用的锁；与 Windows / 打包后的 exe 行为一致
+        with ProcessPoolExecutor(max_workers=n, initializer=_region_worker_init, initargs=(pdf_path,),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            for res in pool.map(_render_region_page, pages, *[[a] * len(pages) for a in args]):
+                yield res
+
+    rules: List[Dict[str, Any]] = []
+    nbytes = 0
+    try:
+        for res in page_results():  # 按页码顺序返回
+            pno = res["page"]
+            for reg in res["regions"]:
+                img_name = os.path.basename(reg["path"])
+                rec = dict(input=pdf_abs, output=to_posix_abs(reg["path"]), page=pno + 1,
+                           region=[round(v, 2) for v in reg["rect"]], format=fmt)
+                if reg["error"]:
+                    log(f"⚠️ 第{pno+1}页 区域渲染失败：{img_name} -> {reg['error']}")
+                    if mf: mf.write(status="fail", error=reg["error"], error_class=reg["error_class"], **rec)
+                    continue
+                nbytes += reg["bytes"]
+                if mf: mf.write(status="ok", error="", error_class="", bytes_out=reg["bytes"],
+                                duration=round(reg["duration"], 4), **rec)
+                rule = rect_to_rule(reg["rect"], res["page_h"], unit, use_pdf_origin, page=str(pno + 1))
+                rules.append(dict(image=rec["output"], **rule))
+                log(
+                    f"第{pno+1}页：保存 {img_name} | "
+                    f"X={rule['x']}{unit}, Y={rule['y']}{unit}, "
+                    f"W={rule['width']}{unit}, H={rule['height']}{unit}"
+                )
+    finally:
+        if mf: mf.close()
+
+    json_path = write_extract_config(os.path.join(out_root, f"{pdf_base}_regions_config.json"),
+                                     unit, use_pdf_origin, rules)
+    log(f"=== 完成：渲染区域 {len(rules)} 个（{nbytes / 1024:.1f} KB） ===")
+    log(f"JSON 配置：{json_path}")
+    if mf: log(f"结果清单：{to_posix_abs(manifest_path)}")
+    return dict(rules=rules, count=len(rules), bytes=nbytes, json_path=json_path, manifest_path=manifest_path or "")
+
 # ========= 打开系统默认图片查看器 =========
 def open_in_default_viewer(path: str) -> bool:
     if not path or not os.path.isfile(path): return False
@@ -182,6 +1137,97 @@ def open_in_default_viewer(path: str) -> bool:
     except Exception:
         return False
 
+# ========= 插入预览：渲染缓存 / 后台渲染 / 预览控件 =========
+class PageRenderCache:
+    """线程安全的 LRU：键为 (文件, 修改时间, 页号, 缩放)，值为渲染结果 dict"""
+    def __init__(self, max_items: int = PREVIEW_CACHE_PAGES):
+        self.max_items = max(1, int(max_items))
+        self._d: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str, pno: int, zoom: float) -> Optional[Tuple]:
+        try: return (to_posix_abs(path), os.path.getmtime(path), int(pno), round(float(zoom), 4))
+        except OSError: return None
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            v = self._d.get(key)
+            if v is not None: self._d.move_to_end(key)
+            return v
+
+    def put(self, key, value: Dict[str, Any]):
+        with self._lock:
+            self._d[key] = value; self._d.move_to_end(key)
+            while len(self._d) > self.max_items: self._d.popitem(last=False)
+
+def render_page_preview(path: str, pno: int, zoom: float) -> Dict[str, Any]:
+    """渲染单页为 QImage（不带 alpha），同时返回页面尺寸（pt）与总页数"""
+    doc = fitz.open(path)
+    try:
+        if doc.is_encrypted and not doc.authenticate(""): raise ValueError("PDF 已加密且无法解密")
+        pno = max(0, min(int(pno), len(doc) - 1))
+        page = doc[pno]
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        img = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888).copy()
+        return dict(image=img, pno=pno, page_w=page.rect.width, page_h=page.rect.height, page_count=len(doc))
+    finally:
+        doc.close()
+
+class PreviewRenderWorker(QObject):
+    rendered = pyqtSignal(object)  # dict：path, req_pno, error 以及 render_page_preview 的结果
+
+    def __init__(self, cache: PageRenderCache, lock: threading.Lock):
+        super().__init__()
+        self.cache = cache
+        self.lock = lock  # 与批量插入互斥：PyMuPDF 不支持多线程并发
+
+    def render(self, path: str, pno: int, zoom: float):
+        try:
+            key = self.cache.key(path, pno, zoom)
+            res = self.cache.get(key) if key else None
+            if res is None:
+                with self.lock: res = render_page_preview(path, pno, zoom)
+                if key: self.cache.put(key, res)
+            self.rendered.emit(dict(res, path=path, req_pno=pno, error=""))
+        except Exception as e:
+            self.rendered.emit(dict(path=path, req_pno=pno, error=str(e)))
+
+class PagePreview(QWidget):
+    """显示预览页并叠加规则矩形；规则变化只重绘矩形，不重新渲染页面"""
+    def __init__(self):
+        super().__init__()
+        self.setMinimumSize(300, 400)
+        self._img: Optional[QImage] = None
+        self._page_w = 1.0
+        self._rects: List[Tuple[float, float, float, float]] = []
+        self._msg = "选择预览 PDF 后显示页面"
+
+    def set_page(self, img: Optional[QImage], page_w: float = 1.0, msg: str = ""):
+        self._img = img; self._page_w = max(1.0, float(page_w)); self._msg = msg
+        self.update()
+
+    def set_rects(self, rects: List[Tuple[float, float, float, float]]):
+        self._rects = rects
+        self.update()
+
+    def paintEvent(self, _event):
+        p = QPainter(self)
+        p.fillRect(self.rect(), QColor("#f0f0f0"))
+        if self._img is None or self._img.isNull():
+            p.setPen(QColor("#888")); p.drawText(self.rect(), Qt.AlignCenter | Qt.TextWordWrap, self._msg)
+            p.end(); return
+        s = min(self.width() / self._img.width(), self.height() / self._img.height())
+        w, h = self._img.width() * s, self._img.height() * s
+        ox, oy = (self.width() - w) / 2, (self.height() - h) / 2
+        p.setRenderHint(QPainter.SmoothPixmapTransform)
+        p.drawImage(QRectF(ox, oy, w, h), self._img)
+        k = w / self._page_w  # pt -> 控件像素
+        p.setPen(QPen(QColor(220, 30, 60), 1.5)); p.setBrush(QColor(220, 30, 60, 50))
+        for x0, y0, x1, y1 in self._rects:
+            p.drawRect(QRectF(ox + x0 * k, oy + y0 * k, (x1 - x0) * k, (y1 - y0) * k))
+        p.end()
+
 # ========= 禁止第0列编辑（图片路径列） =========
 class PathColumnNoEditDelegate(QStyledItemDelegate):
     def createEditor(self, parent, option, index):
@@ -198,7 +1244,10 @@ class InsertWorker(QObject):
     finished = pyqtSignal(int, int, str)  # ok, fail, out_root_abs
 
     def __init__(self, root: str, out_root_abs: str, add_suffix: bool,
-                 rules: List[Dict[str, Any]], unit: str, origin_mode: str):
+                 rules: List[Dict[str, Any]], unit: str, origin_mode: str,
+                 shard: Optional[Tuple[int, int]] = None, manifest_path: str = "",
+                 jobs: Optional[Dict[str, List[Dict[str, Any]]]] = None, mode: str = "overlay",
+                 check_first: bool = True, image_max_px: int = 0, image_cache_dir: Optional[str] = IMAGE_CACHE_DIR):
         super().__init__()
         self.root = root
         self.out_root_abs = out_root_abs
@@ -206,41 +1255,147 @@ class InsertWorker(QObject):
         self.rules = rules
         self.unit = unit
         self.origin_mode = origin_mode
+        self.shard = shard
+        self.manifest_path = manifest_path
+        self._manifest: Optional[ManifestWriter] = None
+        self.jobs = jobs  # 逐文件清单模式：{相对路径: 规则列表}
+        self._job_keys: Dict[str, str] = {}  # collect_pdfs 生成的路径 -> 清单键
+        # image_cache_dir 为空时不使用磁盘缓存
+        self.images = ImageCache(image_max_px, DiskImageCache(image_cache_dir) if image_cache_dir else None)
+        self.sources = SourcePdfCache()
+        self.mode = mode if mode in INSERT_MODES else "overlay"
+        self.check_first = check_first  # 处理前并行预检
 
     def _emit(self, s: str):
         self.log.emit(s)
 
+    def collect_pdfs(self) -> Tuple[List[str], int]:
+        """待处理 PDF 列表（排除输出目录；指定分片时只保留本分片），以及分片前的总数"""
+        # 清单模式直接按清单中的相对路径定位文件，无需遍历整个目录
+        if self.jobs is not None:
+            # 记下每个路径对应的清单键，查规则时用同一个键，不再由路径反推
+            self._job_keys = {os.path.join(self.root, rel): rel for rel in self.jobs}
+            pdf_list = sorted(self._job_keys, key=self._job_keys.get)
+        else:
+            pdf_list = walk_pdfs(self.root, self.out_root_abs)
+        return select_shard(pdf_list, self.root, self.shard), len(pdf_list)
+
+    def run_preflight(self, pdf_list: List[str]) -> Dict[str, Any]:
+        rep = preflight(pdf_list, self._rules_for, progress=self.progress_val.emit)
+        for line in format_preflight(rep): self._emit(line)
+        return rep
+
+    def _replace_in_place(self, doc: fitz.Document, rule: Dict[str, Any], replaced: set, pdf: str,
+                          pages: set) -> bool:
+        """原位替换 rule["xref"] 指向的图片流；不适用时返回 False，由调用方按叠加方式处理"""
+        xref = int(as_float(rule.get("xref", 0)))
+        if xref <= 0 or is_pdf_source(rule["image"]): return False
+        if xref in replaced: return True  # 同一图片在多页出现时，替换一次即全部生效
+        if not (0 < xref < doc.xref_length() and doc.xref_is_image(xref)):
+            self._emit(f"⚠️ {os.path.basename(pdf)}：xref={xref} 不是图片，改为叠加插入")
+            return False
+        # 不同文档中同一 xref 可能是另一张图：尺寸或内容与提取时记录的不一致则不替换
+        sig = xref_image_signature(doc, xref)
+        diff = [k for k in ("xref_width", "xref_height", "xref_digest")
+                if k in rule and str(rule[k]) != str(sig.get(k, ""))]
+        if diff:
+            self._emit(f"⚠️ {os.path.basename(pdf)}：xref={xref} 与提取时的原图不一致（{'/'.join(diff)}），改为叠加插入")
+            return False
+        # 不用 Page.replace_image：它会把新图留在页面资源里，输出中新图存两份
+        # 新图先嵌入临时页，复制到原 xref 后删除临时页；临时对象在保存时（garbage）清除
+        tmp = doc.new_page()
+        try:
+            new_xref = tmp.insert_image(tmp.rect, stream=self.images.get(rule["image"]))
+            doc.xref_copy(new_xref, xref)
+        finally:
+            doc.delete_page(tmp.number)
+        replaced.add(xref)
+        pages.update(p.number for p in doc if any(img[0] == xref for img in p.get_images(full=True)))
+        return True
+
+    def _rules_for(self, pdf: str) -> List[Dict[str, Any]]:
+        if self.jobs is None: return self.rules
+        return self.jobs.get(self._job_keys.get(pdf) or rel_posix(pdf, self.root), [])
+
+    def _record(self, pdf: str, status: str, out_pdf: str = "", error: Any = None,
+                error_class: str = "", stats: Optional[Dict[str, Any]] = None):
+        """写入一条结果记录；status 为 ok / fail / skipped，error 可直接传异常对象"""
+        if self._manifest is None: return
+        if isinstance(error, BaseException):
+            error_class = error_class or type(error).__name__; error = str(error)
+        st = stats or {}
+        self._manifest.write(
+            rel=rel_posix(pdf, self.root), input=to_posix_abs(pdf),
+            output=to_posix_abs(out_pdf) if out_pdf else "", status=status,
+            error=error or "", error_class=error_class,
+            pages_touched=len(st.get("pages", ())), images_embedded=st.get("images", 0),
+            bytes_in=st.get("bytes_in", 0), bytes_out=_file_size(out_pdf) if status == "ok" else 0,
+            duration=round(time.perf_counter() - st["t0"], 4) if "t0" in st else 0.0,
+        )
+
     def run(self):
         self.started.emit()
         use_pdf_origin = self.origin_mode.startswith("从下往上")
 
-        # 预扫描 PDF 列表，并排除输出目录
-        pdf_list: List[str] = []
-        for dirpath, dirs, files in os.walk(self.root):
-            abs_dirs = [os.path.abspath(os.path.join(dirpath, d)) for d in dirs]
-            dirs[:] = [d for d, absd in zip(dirs, abs_dirs)
-                       if not (absd == self.out_root_abs or absd.startswith(self.out_root_abs + os.sep))]
-            for f in files:
-                if f.lower().endswith(".pdf"):
-                    pdf_list.append(os.path.join(dirpath, f))
-
-        total_steps = max(1, len(pdf_list) * max(1, len(self.rules)))
+        pdf_list, found = self.collect_pdfs()
+        if self.manifest_path:
+            try: self._manifest = ManifestWriter(self.manifest_path)
+            except Exception as e: self._emit(f"⚠️ 无法写入结果清单：{self.manifest_path} -> {e}")
+
+        total_steps = max(1, sum(max(1, len(self._rules_for(p))) for p in pdf_list))
         self.progress_max.emit(total_steps)
         step = 0
         ok = 0
         fail = 0
 
-        self._emit(f"=== 开始处理（单位：{self.unit}；Y基准：{self.origin_mode}） ===")
+        self._emit(f"=== 开始处理（单位：{self.unit}；Y基准：{self.origin_mode}；方式：{INSERT_MODES[self.mode]}） ===")
         self._emit(f"处理目录：{to_posix_abs(self.root)}")
         self._emit(f"输出目录：{to_posix_abs(self.out_root_abs)}")
-
-        for pdf in pdf_list:
+        if self.jobs is not None:
+            self._emit(f"逐文件清单：{len(pdf_list)} 个 PDF")
+        if self.shard:
+            self._emit(f"分片：{self.shard[0]}/{self.shard[1]}（本分片 {len(pdf_list)} / 共 {found} 个 PDF）")
+
+        # 预检：图片不可用时整批终止；无法打开/解密、页码写错的 PDF 直接记为失败，不再进入处理
+        if self.check_first and pdf_list:
+            self.progress_max.emit(max(1, len(pdf_list)))
+            rep = self.run_preflight(pdf_list)
+            if rep["bad_images"]:
+                self._emit("⛔ 规则图片不可用，已终止，请修正后重试。")
+                for pdf in pdf_list: self._record(pdf, "skipped", error="规则图片不可用", error_class="PreflightAborted")
+                if self._manifest is not None: self._manifest.close(); self._manifest = None
+                self.finished.emit(0, len(pdf_list), self.out_root_abs)
+                return
+            bad = {f["path"]: f for f in rep["bad_files"]}
+            for pdf in pdf_list:
+                if pdf in bad:
+                    fail += 1
+                    self._record(pdf, "fail", error=bad[pdf]["error"], error_class=bad[pdf]["error_class"],
+                                 stats=dict(bytes_in=bad[pdf]["bytes"]))
+            pdf_list = [p for p in pdf_list if p not in bad]
+            total_steps = max(1, sum(max(1, len(self._rules_for(p))) for p in pdf_list))
+            self.progress_max.emit(total_steps); self.progress_val.emit(0)
+
+        for pdf, data, err in PdfPrefetcher(pdf_list):
+            rules = self._rules_for(pdf)
+            # 单文件统计：涉及页、新嵌入的图片对象数、读入字节、耗时
+            st = dict(t0=time.perf_counter(), pages=set(), images=0, bytes_in=len(data) if data else 0)
+            if not rules:  # 没有规则时不能原样另存为“成功”
+                fail += 1
+                self._emit(f"⚠️ 没有适用的规则：{pdf}")
+                self._record(pdf, "fail", error="没有适用的规则", error_class="NoRules", stats=st)
+                step += 1
+                self.progress_val.emit(step)
+                continue
             try:
-                doc = fitz.open(pdf)
+                if err is not None: raise err
+                doc = fitz.open(stream=data, filetype="pdf")
+                data = None
             except Exception as e:
                 fail += 1
                 self._emit(f"⚠️ 无法打开：{pdf} -> {e}")
-                step += max(1, len(self.rules))
+                self._record(pdf, "fail", error=e, stats=st)
+                step += max(1, len(rules))
                 self.progress_val.emit(step)
                 continue
 
@@ -250,50 +1405,59 @@ class InsertWorker(QObject):
                     if not doc.authenticate(""):
                         fail += 1
                         self._emit(f"⚠️ 加密且无法解密，跳过：{pdf}")
+                        self._record(pdf, "fail", error="加密且无法解密", error_class="EncryptedPDF", stats=st)
                         doc.close()
-                        step += max(1, len(self.rules))
+                        step += max(1, len(rules))
                         self.progress_val.emit(step)
                         continue
                 except Exception:
                     fail += 1
                     self._emit(f"⚠️ 加密文件，跳过：{pdf}")
+                    self._record(pdf, "fail", error="加密且无法解密", error_class="EncryptedPDF", stats=st)
                     doc.close()
-                    step += max(1, len(self.rules))
+                    step += max(1, len(rules))
                     self.progress_val.emit(step)
                     continue
 
             try:
-                for rule in self.rules:
-                    # —— 按规则插入 —— 
-                    X = as_float(rule["x"]); Y = as_float(rule["y"])
-                    W = as_float(rule["width"]); H = as_float(rule["height"])
-                    Sx = as_float(rule["scale_x"], 100.0); Sy = as_float(rule["scale_y"], 100.0)
-                    keep_aspect = bool(rule.get("keep_aspect", True))
-                    if keep_aspect:
-                        s = min(Sx, Sy) / 100.0; Wf, Hf = W * s, H * s
-                    else:
-                        Wf, Hf = W * (Sx/100.0), H * (Sy/100.0)
-
-                    x_pt = to_pt(X, self.unit); w_pt = to_pt(Wf, self.unit)
-                    y_input_pt = to_pt(Y, self.unit); h_pt = to_pt(Hf, self.unit)
-
-                    pno = page_index(doc, rule["page"]); page = doc[pno]
-                    page_h = page.rect.height
-                    if use_pdf_origin:
-                        x0 = x_pt; y0 = page_h - (y_input_pt + h_pt)
-                    else:
-                        x0 = x_pt; y0 = y_input_pt
-
-                    rect = fitz.Rect(x0, y0, x0 + w_pt, y0 + h_pt)
-                    page.insert_image(rect, filename=rule["image"], keep_proportion=False)
+                if not self.check_first:  # 未预检时，按实际页数提示越界/无对应页的规则
+                    for w in rule_page_warnings(len(doc), rules)[0]: self._emit(f"⚠️ {os.path.basename(pdf)}：{w}")
+                replaced = set()  # 本文档中已原位替换的 xref
+                shown = set()     # 本文档中已生成 Form XObject 的矢量源页
+                for rule in rules:
+                    n_replaced = len(replaced)
+                    if self.mode == "replace" and self._replace_in_place(doc, rule, replaced, pdf, st["pages"]):
+                        st["images"] += len(replaced) - n_replaced
+                        step += 1
+                        self.progress_val.emit(step)
+                        continue
+                    # —— 按规则插入：图片在本文档中只嵌入一次，其余页按 xref 引用 —— 
+                    # 源为 PDF 时按矢量页面叠加（show_pdf_page），不栅格化
+                    src = self.sources.get(rule["image"]) if is_pdf_source(rule["image"]) else None
+                    src_pno = max(0, min(int(as_float(rule.get("src_page", 1), 1)) - 1, len(src) - 1)) if src else 0
+                    xref = 0
+                    for pno in page_set(len(doc), rule["page"]):
+                        page = doc[pno]
+                        rect = rule_rect(rule, page.rect.height, self.unit, use_pdf_origin)
+                        if src is not None:
+                            page.show_pdf_page(rect, src, src_pno, keep_proportion=False)
+                            shown.add((to_posix_abs(rule["image"]), src_pno))
+                        elif xref:
+                            page.insert_image(rect, xref=xref, keep_proportion=False)
+                        else:
+                            xref = page.insert_image(rect, stream=self.images.get(rule["image"]), keep_proportion=False)
+                            st["images"] += 1
+                        st["pages"].add(pno)
 
                     step += 1
                     self.progress_val.emit(step)
                     # self._emit(f"· 已在 “{os.path.basename(pdf)}” 第{pno+1}页插入 1 张图")
+                st["images"] += len(shown)
 
             except Exception as e:
                 fail += 1
                 self._emit(f"⚠️ 插入失败：{pdf} -> {e}")
+                self._record(pdf, "fail", error=e, stats=st)
                 try: doc.close()
                 except: pass
                 continue
@@ -307,21 +1471,31 @@ class InsertWorker(QObject):
             out_pdf = os.path.join(out_dir, name + ext)
 
             try:
-                doc.save(out_pdf); ok += 1
+                doc.save(out_pdf, garbage=1 if replaced else 0); ok += 1  # 原位替换后清除无引用的临时对象
                 self._emit(f"✅ 已处理：{to_posix_abs(out_pdf)}")
+                self._record(pdf, "ok", out_pdf, stats=st)
             except Exception as e:
                 fail += 1
                 self._emit(f"⚠️ 保存失败：{to_posix_abs(out_pdf)} -> {e}")
+                self._record(pdf, "fail", out_pdf, error=e, stats=st)
             finally:
                 try: doc.close()
                 except: pass
 
+        self.sources.close()
+        self.images.close()
         self._emit(f"=== 完成：成功 {ok}，失败 {fail} ===")
+        if self._manifest is not None:
+            self._manifest.close(); self._manifest = None
+            self._emit(f"结果清单：{to_posix_abs(self.manifest_path)}")
         self.finished.emit(ok, fail, self.out_root_abs)
 
 # ========= 页签B：批量插入（保持 v1.2.1 输出目录逻辑，新增进度条/打开目录） =========
+IMAGE_FILTER = "图片 / 矢量 PDF (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.pdf)"
+
 class TabInsert(QWidget):
-    COLS = ["图片路径","X(单位)","Y(单位)","宽W(单位)","高H(单位)","X缩放%","Y缩放%","页(数字或last)","保持等比"]
+    preview_requested = pyqtSignal(str, int, float)  # path, 0 基页号, 缩放
+    COLS = ["图片路径","X(单位)","Y(单位)","宽W(单位)","高H(单位)","X缩放%","Y缩放%","页(数字/last/all/odd/even/last-N/1-3)","保持等比"]
 
     def __init__(self):
         super().__init__()
@@ -330,6 +1504,7 @@ class TabInsert(QWidget):
         # 保持：用户手动修改输出目录的标记
         self.out_modified_by_user = False
         self.last_out_dir = ""  # 处理完成后用于“打开输出目录”
+        self.image_max_px = 0   # 来自导入的配置：规则图片长边上限（0 = 不降采样）
 
         g.addWidget(QLabel("处理目录："), r, 0)
         self.le_root = QLineEdit()
@@ -342,6 +1517,21 @@ class TabInsert(QWidget):
         b_out = QPushButton("浏览…"); b_out.clicked.connect(self.choose_out)
         g.addWidget(self.le_out, r, 1, 1, 7); g.addWidget(b_out, r, 8); r += 1
 
+        g.addWidget(QLabel("逐文件清单："), r, 0)
+        self.le_jobs = QLineEdit(); self.le_jobs.setPlaceholderText("可选：CSV/JSONL，按 PDF 相对路径指定各自的图片与参数")
+        b_jobs = QPushButton("浏览…"); b_jobs.clicked.connect(self.choose_jobs)
+        g.addWidget(self.le_jobs, r, 1, 1, 7); g.addWidget(b_jobs, r, 8); r += 1
+
+        g.addWidget(QLabel("预览 PDF："), r, 0)
+        self.le_preview = QLineEdit(); self.le_preview.setPlaceholderText("可选：选一个样例 PDF，实时查看规则摆放位置")
+        self.le_preview.editingFinished.connect(self.request_preview)
+        b_preview = QPushButton("浏览…"); b_preview.clicked.connect(self.choose_preview)
+        g.addWidget(self.le_preview, r, 1, 1, 5); g.addWidget(b_preview, r, 6)
+        g.addWidget(QLabel("预览页："), r, 7)
+        self.sp_preview_page = QSpinBox(); self.sp_preview_page.setRange(1, 1)
+        self.sp_preview_page.valueChanged.connect(self.request_preview)
+        g.addWidget(self.sp_preview_page, r, 8); r += 1
+
         self.cb_suffix = QCheckBox("文件名添加后缀 _signed"); g.addWidget(self.cb_suffix, r, 1, 1, 2)
 
         g.addWidget(QLabel("单位："), r, 3)
@@ -364,12 +1554,21 @@ class TabInsert(QWidget):
         for c in range(1, len(self.COLS)-1):
             self.tab.horizontalHeader().setSectionResizeMode(c, QHeaderView.ResizeToContents)
         self.tab.horizontalHeader().setSectionResizeMode(len(self.COLS)-1, QHeaderView.ResizeToContents)
-        g.addWidget(self.tab, r, 0, 1, 9); r += 1
+        g.addWidget(self.tab, r, 0, 1, 9)
+        self.preview = PagePreview()
+        g.addWidget(self.preview, r, 9, 3, 1); g.setColumnStretch(9, 1); r += 1
         self.tab.setItemDelegate(PathColumnNoEditDelegate(self.tab))
 
         b_add = QPushButton("添加图片…"); b_add.clicked.connect(self.add_rows)
         b_del = QPushButton("删除所选"); b_del.clicked.connect(self.del_rows)
-        g.addWidget(b_add, r, 0); g.addWidget(b_del, r, 1); r += 1
+        g.addWidget(b_add, r, 0); g.addWidget(b_del, r, 1)
+
+        g.addWidget(QLabel("插入方式："), r, 3)
+        self.cb_mode = QComboBox()
+        for key, label in INSERT_MODES.items(): self.cb_mode.addItem(label, key)
+        self.cb_mode.setToolTip("原位替换：按提取配置中记录的 xref 直接替换原图，所有引用该图的页面同时生效；\n"
+                                "无 xref 或目标不是图片的规则仍按叠加插入")
+        g.addWidget(self.cb_mode, r, 4, 1, 2); r += 1
 
         self.log = QTextEdit(); self.log.setReadOnly(True)
         g.addWidget(self.log, r, 0, 1, 9); r += 1
@@ -382,8 +1581,13 @@ class TabInsert(QWidget):
         self.btn_go = QPushButton("开始处理"); self.btn_go.clicked.connect(self.run)
         self.btn_open_out = QPushButton("打开输出目录"); self.btn_open_out.setEnabled(False)
         self.btn_open_out.clicked.connect(self.open_out_dir)
+        self.cb_preflight = QCheckBox("处理前预检（检查图片、PDF 能否打开/解密与页码）"); self.cb_preflight.setChecked(True)
         g.addWidget(self.btn_go, r, 0, 1, 2)
-        g.addWidget(self.btn_open_out, r, 2, 1, 2); r += 1
+        g.addWidget(self.btn_open_out, r, 2, 1, 2)
+        self.cb_manifest = QCheckBox("写入结果清单 manifest.jsonl"); self.cb_manifest.setChecked(True)
+        self.cb_manifest.setToolTip("在输出目录逐行记录每个 PDF 的状态、错误类型、页数、嵌入图片数、字节数与耗时，供下游程序读取")
+        g.addWidget(self.cb_preflight, r, 4, 1, 3)
+        g.addWidget(self.cb_manifest, r, 7, 1, 2); r += 1
 
         self.tab.cellDoubleClicked.connect(self.on_cell_double_clicked)
         self.tab.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -393,6 +1597,24 @@ class TabInsert(QWidget):
         self._thread: Optional[QThread] = None
         self._worker: Optional[InsertWorker] = None
 
+        # 预览：常驻渲染线程 + LRU 缓存；表格/单位/Y基准变化时只重算矩形
+        self._preview_cache = PageRenderCache()
+        self._preview_meta: Optional[Dict[str, Any]] = None
+        self._preview_thread = QThread(self)
+        self._fitz_lock = threading.Lock()  # 批量处理期间由插入任务持有，预览渲染暂停
+        self._batch_running = False
+        self._preview_worker = PreviewRenderWorker(self._preview_cache, self._fitz_lock)
+        self._preview_worker.moveToThread(self._preview_thread)
+        self.preview_requested.connect(self._preview_worker.render)
+        self._preview_worker.rendered.connect(self._on_preview_rendered)
+        self._preview_thread.finished.connect(self._preview_worker.deleteLater)
+        self._preview_thread.start()
+        app = QCoreApplication.instance()
+        if app is not None: app.aboutToQuit.connect(self._stop_preview_thread)
+        self.tab.cellChanged.connect(lambda *_: self.refresh_preview_rects())
+        self.cb_unit.currentIndexChanged.connect(lambda *_: self.refresh_preview_rects())
+        self.cb_origin.currentIndexChanged.connect(lambda *_: self.refresh_preview_rects())
+
     def _on_out_edited(self, _text: str):
         self.out_modified_by_user = True
 
@@ -406,6 +1628,64 @@ class TabInsert(QWidget):
                 self.le_out.setText(to_posix_abs(default_out))
                 self.out_modified_by_user = False  # 自动填充不算用户修改
 
+    # —— 预览 ——
+    def choose_preview(self):
+        fn, _ = QFileDialog.getOpenFileName(self, "选择预览用的样例 PDF", self.le_root.text().strip() or os.getcwd(),
+                                            "PDF (*.pdf)")
+        if fn:
+            self.le_preview.setText(to_posix_abs(fn))
+            self.request_preview()
+
+    def request_preview(self, *_):
+        path = self.le_preview.text().strip()
+        if not path or not os.path.isfile(path):
+            self._preview_meta = None; self.preview.set_page(None, msg="选择预览 PDF 后显示页面"); return
+        pno = self.sp_preview_page.value() - 1
+        zoom = PREVIEW_DPI / INCH_TO_PT
+        key = self._preview_cache.key(path, pno, zoom)
+        hit = self._preview_cache.get(key) if key else None
+        if hit is not None:  # 缓存命中：直接显示，不经过渲染线程
+            self._on_preview_rendered(dict(hit, path=path, req_pno=pno, error=""))
+        elif self._batch_running:  # 批量处理期间不再排队渲染，结束后自动刷新
+            self._preview_meta = None; self.preview.set_page(None, msg="批量处理进行中，结束后显示预览")
+        else:
+            self.preview_requested.emit(path, pno, zoom)
+
+    def _on_preview_rendered(self, res: Dict[str, Any]):
+        # 丢弃过期结果（用户已切换文件或页码）
+        if res["path"] != self.le_preview.text().strip() or res["req_pno"] != self.sp_preview_page.value() - 1:
+            return
+        if res["error"]:
+            self._preview_meta = None; self.preview.set_page(None, msg=f"预览失败：{res['error']}"); return
+        self._preview_meta = res
+        self.sp_preview_page.blockSignals(True)
+        self.sp_preview_page.setRange(1, max(1, res["page_count"]))
+        self.sp_preview_page.blockSignals(False)
+        self.preview.set_page(res["image"], res["page_w"])
+        self.refresh_preview_rects()
+
+    def refresh_preview_rects(self):
+        meta = self._preview_meta
+        if meta is None: return
+        unit = self.cb_unit.currentText().strip() or "cm"
+        use_pdf_origin = self.cb_origin.currentText().startswith("从下往上")
+        rects = []
+        for rule in self.collect_rules(quiet=True):
+            try:
+                if meta["pno"] not in page_set(meta["page_count"], rule["page"]): continue
+            except ValueError:
+                continue  # 页码正在编辑中/写错时暂不显示
+            rc = rule_rect(rule, meta["page_h"], unit, use_pdf_origin)
+            rects.append((rc.x0, rc.y0, rc.x1, rc.y1))
+        self.preview.set_rects(rects)
+
+    def _stop_preview_thread(self):
+        self._preview_thread.quit(); self._preview_thread.wait(2000)
+
+    def choose_jobs(self):
+        fn, _ = QFileDialog.getOpenFileName(self, "选择逐文件清单", os.getcwd(), "清单 (*.csv *.jsonl)")
+        if fn: self.le_jobs.setText(to_posix_abs(fn))
+
     def choose_out(self):
         d = QFileDialog.getExistingDirectory(self, "选择输出目录（可不选）", os.getcwd())
         if d:
@@ -416,7 +1696,7 @@ class TabInsert(QWidget):
 
     def add_rows(self):
         paths, _ = QFileDialog.getOpenFileNames(self, "选择图片（可多选）", os.getcwd(),
-                                                "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)")
+                                                IMAGE_FILTER)
         for p in paths:
             p = to_posix_abs(p)
             r = self.tab.rowCount(); self.tab.insertRow(r)
@@ -427,10 +1707,12 @@ class TabInsert(QWidget):
                 it = QTableWidgetItem(v); it.setTextAlignment(Qt.AlignCenter)
                 self.tab.setItem(r, c, it)
             chk = QCheckBox(); chk.setChecked(True); self.tab.setCellWidget(r, 8, chk)
+            chk.toggled.connect(lambda *_: self.refresh_preview_rects())
 
     def del_rows(self):
         rows = sorted({i.row() for i in self.tab.selectedIndexes()}, reverse=True)
         for r in rows: self.tab.removeRow(r)
+        self.refresh_preview_rects()
 
     def on_cell_double_clicked(self, row: int, col: int):
         if col != 0: return
@@ -457,15 +1739,18 @@ class TabInsert(QWidget):
             row = rows[0]
         old = self.tab.item(row, 0).text() if self.tab.item(row, 0) else ""
         new_path, _ = QFileDialog.getOpenFileName(self, "选择替换后的图片", os.path.dirname(old) or os.getcwd(),
-                                                  "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)")
+                                                  IMAGE_FILTER)
         if not new_path: return
         new_path = to_posix_abs(new_path)
+        extra = self.tab.item(row, 0).data(Qt.UserRole) if self.tab.item(row, 0) else None
         it0 = QTableWidgetItem(new_path); it0.setTextAlignment(Qt.AlignVCenter | Qt.AlignLeft)
+        if extra: it0.setData(Qt.UserRole, extra)
         self.tab.setItem(row, 0, it0)
         self.logln(f"🔁 第{row+1}行：已替换图片\n旧：{old}\n新：{new_path}")
 
-    def collect_rules(self) -> List[Dict[str, Any]]:
+    def collect_rules(self, quiet: bool = False) -> List[Dict[str, Any]]:
         rules = []
+        logln = (lambda _s: None) if quiet else self.logln
         unit = self.cb_unit.currentText().strip() or "cm"
         for r in range(self.tab.rowCount()):
             def item(col):
@@ -474,14 +1759,16 @@ class TabInsert(QWidget):
                 w = self.tab.cellWidget(r, col); return bool(w.isChecked()) if isinstance(w, QCheckBox) else False
             img = item(0)
             if not img:
-                self.logln(f"⚠️ 第{r+1}行：图片路径为空，已跳过。"); continue
+                logln(f"⚠️ 第{r+1}行：图片路径为空，已跳过。"); continue
             X = as_float(item(1)); Y = as_float(item(2))
             W = as_float(item(3)); H = as_float(item(4))
             Sx = as_float(item(5), 100.0); Sy = as_float(item(6), 100.0)
             page = item(7) or "last"; keep = chk(8)
-            if W <= 0 or H <= 0: self.logln(f"⚠️ 第{r+1}行：宽/高必须>0，已跳过。"); continue
-            if Sx <= 0 or Sy <= 0: self.logln(f"⚠️ 第{r+1}行：缩放%应>0，已跳过。"); continue
-            rules.append(dict(image=img, x=X, y=Y, width=W, height=H,
+            if W <= 0 or H <= 0: logln(f"⚠️ 第{r+1}行：宽/高必须>0，已跳过。"); continue
+            if Sx <= 0 or Sy <= 0: logln(f"⚠️ 第{r+1}行：缩放%应>0，已跳过。"); continue
+            it0 = self.tab.item(r, 0)
+            extra = dict(it0.data(Qt.UserRole) or {}) if it0 else {}  # 表格未显示的字段（如 src_page）原样保留
+            rules.append(dict(extra, image=img, x=X, y=Y, width=W, height=H,
                               scale_x=Sx, scale_y=Sy, page=str(page), keep_aspect=keep, unit=unit))
         return rules
 
@@ -498,6 +1785,8 @@ class TabInsert(QWidget):
             add_suffix=self.cb_suffix.isChecked(),
             output_dir=self.le_out.text().strip(),
             y_origin=self.cb_origin.currentText(),
+            insert_mode=self.cb_mode.currentData(),
+            image_max_px=self.image_max_px,
             rules=norm_rules
         )
         fn, _ = QFileDialog.getSaveFileName(self, "导出配置为 JSON", os.getcwd(), "JSON (*.json)")
@@ -523,6 +1812,9 @@ class TabInsert(QWidget):
         yorg = cfg.get("y_origin","从下往上（PDF 标准）")
         if yorg not in ("从下往上（PDF 标准）","从上往下（屏幕/GUI）"): yorg = "从下往上（PDF 标准）"
         self.cb_origin.setCurrentText(yorg)
+        self.image_max_px = max(0, int(as_float(cfg.get("image_max_px", 0))))
+        mi = self.cb_mode.findData(cfg.get("insert_mode", "overlay"))
+        self.cb_mode.setCurrentIndex(mi if mi >= 0 else 0)
 
         # 仅当配置中提供非空 output_dir 时才覆盖当前值（保持 v1.2.1 行为）
         outd = (cfg.get("output_dir","") or "").strip()
@@ -535,6 +1827,7 @@ class TabInsert(QWidget):
             r = self.tab.rowCount(); self.tab.insertRow(r)
             it0 = QTableWidgetItem(resolve_posix_from_config(base_dir, rule.get("image","")))
             it0.setTextAlignment(Qt.AlignVCenter | Qt.AlignLeft)
+            it0.setData(Qt.UserRole, {k: v for k, v in rule.items() if k not in RULE_KEYS + ("image", "unit")})
             self.tab.setItem(r, 0, it0)
             vals = [
                 str(rule.get("x","")), str(rule.get("y","")),
@@ -546,6 +1839,7 @@ class TabInsert(QWidget):
                 it = QTableWidgetItem(v); it.setTextAlignment(Qt.AlignCenter)
                 self.tab.setItem(r, ci, it)
             chk = QCheckBox(); chk.setChecked(bool(rule.get("keep_aspect", True)))
+            chk.toggled.connect(lambda *_: self.refresh_preview_rects())
             self.tab.setCellWidget(r, 8, chk)
         self.logln(f"✅ 已导入配置：{fn}（共{self.tab.rowCount()}条规则）")
 
@@ -563,7 +1857,12 @@ class TabInsert(QWidget):
         add_suffix = self.cb_suffix.isChecked()
 
         rules = self.collect_rules()
-        if not rules: QMessageBox.information(self, "提示", "没有有效规则，无法处理。"); return
+        jobs = None
+        jobs_fn = self.le_jobs.text().strip()
+        if jobs_fn:
+            try: jobs = load_stamp_jobs(jobs_fn, rules)
+            except Exception as e: QMessageBox.critical(self, "清单错误", f"无法读取逐文件清单：{e}"); return
+        if not rules and not jobs: QMessageBox.information(self, "提示", "没有有效规则，无法处理。"); return
 
         # UI 状态
         self.btn_go.setEnabled(False)
@@ -573,7 +1872,11 @@ class TabInsert(QWidget):
 
         # 后台线程
         self._thread = QThread(self)
-        self._worker = InsertWorker(root, out_root_abs, add_suffix, rules, unit, origin_mode)
+        self._worker = InsertWorker(root, out_root_abs, add_suffix, rules, unit, origin_mode, jobs=jobs,
+                                    mode=self.cb_mode.currentData(), check_first=self.cb_preflight.isChecked(),
+                                    manifest_path=os.path.join(out_root_abs, manifest_name(None))
+                                    if self.cb_manifest.isChecked() else "",
+                                    image_max_px=self.image_max_px)
         self._worker.moveToThread(self._thread)
 
         # 信号连接
@@ -587,6 +1890,8 @@ class TabInsert(QWidget):
             self.btn_open_out.setEnabled(True)
             self.last_out_dir = outdir
             self.logln(f"📁 输出目录：{to_posix_abs(outdir)}")
+            self._batch_running = False; self._fitz_lock.release()
+            self.request_preview()
 
         self._worker.finished.connect(_on_finished)
 
@@ -595,6 +1900,8 @@ class TabInsert(QWidget):
         self._worker.finished.connect(self._worker.deleteLater)
         self._thread.finished.connect(self._thread.deleteLater)
 
+        # 等正在进行的预览渲染（至多一页低分辨率）结束，处理期间预览不再调用 PyMuPDF
+        self._fitz_lock.acquire(); self._batch_running = True
         self._thread.start()
 
     def open_out_dir(self):
@@ -611,6 +1918,22 @@ class TabInsert(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "无法打开", f"打开目录失败：{e}")
 
+# ========= 提取：后台线程 =========
+class ExtractWorker(QObject):
+    log = pyqtSignal(str)
+    finished = pyqtSignal(object, str)  # 结果 dict（失败时为 None）, 错误信息
+
+    def __init__(self, fn, args: tuple, kwargs: Dict[str, Any]):
+        super().__init__()
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+
+    def run(self):
+        try:
+            res, err = self.fn(*self.args, log=self.log.emit, **self.kwargs), ""
+        except Exception as e:
+            res, err = None, str(e)
+        self.finished.emit(res, err)
+
 # ========= 页签A：从 PDF 提取（保持 v1.2.1） =========
 class TabExtract(QWidget):
     def __init__(self):
@@ -643,7 +1966,29 @@ class TabExtract(QWidget):
 
         self.cb_flatten = QCheckBox("导出时白底（去透明）")
         self.cb_flatten.setChecked(False)
-        g.addWidget(self.cb_flatten, r, 1, 1, 3); r += 1
+        g.addWidget(self.cb_flatten, r, 1, 1, 2)
+
+        g.addWidget(QLabel("导出格式："), r, 3)
+        self.cb_fmt = QComboBox()
+        for key, spec in EXPORT_FORMATS.items(): self.cb_fmt.addItem(spec[2], key)
+        g.addWidget(self.cb_fmt, r, 4)
+        g.addWidget(QLabel("质量/压缩级别："), r, 5)
+        self.sp_quality = QSpinBox()
+        self.sp_quality.setToolTip("PNG：压缩级别 0-9；JPEG/WebP：质量 1-100；无损 WebP：压缩力度 0-100")
+        g.addWidget(self.sp_quality, r, 6); r += 1
+        self.cb_fmt.currentIndexChanged.connect(self._on_fmt_changed); self._on_fmt_changed()
+
+        g.addWidget(QLabel("提取方式："), r, 0)
+        self.cb_mode = QComboBox()
+        for key, label in EXTRACT_MODES.items(): self.cb_mode.addItem(label, key)
+        self.cb_mode.setToolTip("区域渲染：只按矩形裁剪渲染内联图片、矢量图形与渐变，不整页栅格化")
+        g.addWidget(self.cb_mode, r, 1, 1, 2)
+        g.addWidget(QLabel("渲染 DPI："), r, 3)
+        self.sp_dpi = QSpinBox(); self.sp_dpi.setRange(36, 1200); self.sp_dpi.setValue(REGION_DPI)
+        g.addWidget(self.sp_dpi, r, 4); r += 1
+        self.cb_mode.currentIndexChanged.connect(
+            lambda _i: self.sp_dpi.setEnabled(self.cb_mode.currentData() == "regions"))
+        self.sp_dpi.setEnabled(False)
 
         self.log = QTextEdit(); self.log.setReadOnly(True)
         g.addWidget(self.log, r, 0, 1, 8); r += 1
@@ -652,6 +1997,10 @@ class TabExtract(QWidget):
         self.btn_go.clicked.connect(self.scan_and_export)
         g.addWidget(self.btn_go, r, 0, 1, 2)
 
+        # 线程对象占位
+        self._thread: Optional[QThread] = None
+        self._worker: Optional[ExtractWorker] = None
+
     def logln(self, s: str): self.log.append(s); self.log.ensureCursorVisible()
 
     def pick_pdf(self):
@@ -667,149 +2016,51 @@ class TabExtract(QWidget):
         d = QFileDialog.getExistingDirectory(self, "选择导出根目录", os.getcwd())
         if d: self.le_out.setText(to_posix_abs(d))
 
+    def _on_fmt_changed(self, _i: int = 0):
+        _, _, _, (q_lo, q_hi), q_def = EXPORT_FORMATS[self.cb_fmt.currentData()]
+        self.sp_quality.setRange(q_lo, q_hi); self.sp_quality.setValue(q_def)
+
     def scan_and_export(self):
         pdf_path = self.le_pdf.text().strip()
         if not pdf_path or not os.path.isfile(pdf_path):
             QMessageBox.warning(self, "提示", "请先选择一个有效的 PDF 文件。"); return
 
         unit = self.cb_unit.currentText().strip() or "cm"
-        origin_mode = self.cb_origin.currentText()
-        use_pdf_origin = origin_mode.startswith("从下往上")
+        use_pdf_origin = self.cb_origin.currentText().startswith("从下往上")
 
         out_root = self.le_out.text().strip()
         if not out_root:
             out_root = os.path.join(os.path.dirname(pdf_path), "pic")
         out_root = os.path.abspath(out_root)
-        ensure_dir(out_root)
-
-        try:
-            doc = fitz.open(pdf_path)
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"无法打开PDF：{e}"); return
-
-        try:
-            if doc.is_encrypted:
-                try:
-                    if not doc.authenticate(""): QMessageBox.critical(self, "错误", "PDF 已加密且无法解密。"); return
-                except Exception:
-                    QMessageBox.critical(self, "错误", "PDF 已加密且无法解密。"); return
-
-            total = len(doc)
-            pages = parse_pages(self.le_pages.text(), total) or list(range(total))
-
-            self.btn_go.setEnabled(False)
-            self.logln(f"=== 开始扫描 ===")
-            self.logln(f"PDF：{pdf_path}")
-            self.logln(f"导出根目录：{to_posix_abs(out_root)}")
-            self.logln(f"单位：{unit}；Y基准：{origin_mode}；页码：{', '.join(str(p+1) for p in pages)}")
-
-            rules: List[Dict[str, Any]] = []
-            img_count = 0
-            pdf_base = os.path.splitext(os.path.basename(pdf_path))[0]
-
-            for pno in pages:
-                page = doc[pno]; page_h = page.rect.height
 
-                # 找出本页所有图片的 xref 与矩形
-                items: List[Tuple[int, Tuple[float,float,float,float]]] = []
-                used_new = False
-                if hasattr(page, "get_image_info"):
-                    try:
-                        infos = page.get_image_info(xrefs=True); used_new = True
-                        for info in infos:
-                            rt = rect_tuple_from_bbox(info.get("bbox"))
-                            xref = info.get("xref") or info.get("image") or info.get("xref0")
-                            if rt and xref: items.append((int(xref), rt))
-                    except Exception:
-                        used_new = False
-                if not used_new:
-                    for img in page.get_images(full=True):
-                        xref = img[0]
-                        rects = []
-                        try: rects = page.get_image_rects(xref)
-                        except Exception: rects = []
-                        for rr in rects:
-                            rt = rect_tuple_from_bbox(rr)
-                            if rt: items.append((xref, rt))
-
-                # 逐个原图导出（合成 alpha / 反相修正）
-                for xref, rect in items:
-                    x0, y0, x1, y1 = rect
-                    w_pt, h_pt = x1 - x0, y1 - y0
+        fmt = self.cb_fmt.currentData()
+        args = (pdf_path, out_root, unit, use_pdf_origin, self.le_pages.text(),
+                self.cb_flatten.isChecked(), fmt, self.sp_quality.value())
+        if self.cb_mode.currentData() == "regions":
+            fn, kwargs = extract_regions, dict(dpi=self.sp_dpi.value())
+        else:
+            fn, kwargs = extract_images, {}
+        self.btn_go.setEnabled(False)
 
-                    try:
-                        pix = build_pixmap_from_xref(doc, xref)
-                        if self.cb_flatten.isChecked() and pix.alpha:
-                            pix = fitz.Pixmap(fitz.csRGB, pix)
-                    except Exception as e:
-                        self.logln(f"⚠️ 第{pno+1}页 xref={xref} 提取失败 -> {e}")
-                        continue
+        # 后台线程：区域渲染/编码期间界面不卡住
+        self._thread = QThread(self)
+        self._worker = ExtractWorker(fn, args, kwargs)
+        self._worker.moveToThread(self._thread)
+        self._thread.started.connect(self._worker.run)
+        self._worker.log.connect(self.logln)
 
-                    img_count += 1
-                    img_name = f"{pdf_base}_{img_count:04d}.png"
-                    img_path = os.path.join(out_root, img_name)
-                    try:
-                        pix.save(img_path)
-                    except Exception as e:
-                        self.logln(f"⚠️ 第{pno+1}页 保存 PNG 失败：{img_name} -> {e}")
-                        continue
-                    finally:
-                        try: pix = None
-                        except: pass
-
-                    # 导出给插入器的坐标（单位换算；Y基准=“从上往下量”）
-                    if use_pdf_origin:
-                        X_unit = pt_to_unit(x0, unit)
-                        Y_unit = pt_to_unit(page_h - y1, unit)  # 左下原点 → 从上往下量
-                    else:
-                        X_unit = pt_to_unit(x0, unit)
-                        Y_unit = pt_to_unit(y0, unit)
-
-                    W_unit = pt_to_unit(w_pt, unit)
-                    H_unit = pt_to_unit(h_pt, unit)
-
-                    rule = dict(
-                        image=to_posix_abs(img_path),
-                        x=round(X_unit, 4),
-                        y=round(Y_unit, 4),
-                        width=round(W_unit, 4),
-                        height=round(H_unit, 4),
-                        scale_x=100.0,
-                        scale_y=100.0,
-                        page=str(pno + 1),
-                        keep_aspect=True,
-                        unit=unit,
-                    )
-                    rules.append(rule)
-
-                    self.logln(
-                        f"第{pno+1}页：保存 {img_name} | "
-                        f"X={rule['x']}{unit}, Y={rule['y']}{unit}, "
-                        f"W={rule['width']}{unit}, H={rule['height']}{unit}"
-                    )
-
-            cfg = dict(
-                version=APP_VERSION,
-                unit=unit,
-                add_suffix=False,   # 提取配置默认不加后缀
-                output_dir="",      # 导出的插入配置不强制指定输出目录
-                y_origin="从下往上（PDF 标准）" if use_pdf_origin else "从上往下（屏幕/GUI）",
-                rules=rules,
-            )
-            json_path = os.path.join(out_root, f"{pdf_base}_config.json")
-            try:
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump(cfg, f, ensure_ascii=False, indent=2)
-                self.logln(f"=== 完成：导出图片 {img_count} 个 ===")
-                self.logln(f"JSON 配置：{json_path}")
-                QMessageBox.information(self, "完成",
-                    f"已导出 {img_count} 张 PNG 到\n{to_posix_abs(out_root)}\n并生成配置：\n{json_path}")
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"写入 JSON 失败：{e}")
-        finally:
-            try: doc.close()
-            except Exception: pass
+        def _on_finished(res: Optional[Dict[str, Any]], err: str):
             self.btn_go.setEnabled(True)
+            if err:
+                QMessageBox.critical(self, "错误", err); return
+            QMessageBox.information(self, "完成",
+                f"已导出 {res['count']} 张 {EXPORT_FORMATS[fmt][2]} 到\n{to_posix_abs(out_root)}\n并生成配置：\n{res['json_path']}")
+
+        self._worker.finished.connect(_on_finished)
+        self._worker.finished.connect(self._thread.quit)
+        self._worker.finished.connect(self._worker.deleteLater)
+        self._thread.finished.connect(self._thread.deleteLater)
+        self._thread.start()
 
 class TabAbout(QWidget):
     def __init__(self):
@@ -890,11 +2141,11 @@ class TabUsage(QWidget):
             </tr>
             <tr>
               <td>📤 <b>从 PDF 提取图片</b></td>
-              <td>扫描 PDF 内嵌图像（XObject），导出为 PNG，并生成 <code>&lt;PDF文件名&gt;_config.json</code> 以记录坐标/尺寸/页码等。</td>
+              <td>扫描 PDF 内嵌图像（XObject），导出为 PNG / JPEG / WebP，并生成 <code>&lt;PDF文件名&gt;_config.json</code> 以记录坐标/尺寸/页码等；也可按区域渲染内联图片、矢量图形与渐变。</td>
             </tr>
             <tr>
               <td>📥 <b>批量插入图片</b></td>
-              <td>按配置或手填参数将图片批量插入多个 PDF，支持缩放、保持等比、页码选择与目录遍历。</td>
+              <td>按配置或手填参数将图片（或矢量 PDF 印章）批量插入多个 PDF，支持缩放、保持等比、页集合、按 xref 原位替换、逐文件清单与目录遍历。</td>
             </tr>
             <tr>
               <td>🧩 <b>智能配置</b></td>
@@ -922,7 +2173,14 @@ class TabUsage(QWidget):
               </ul>
             </li>
             <li><b>页码（如 1,3-5）</b>：可指定扫描页，留空表示扫描所有页。</li>
-            <li><b>导出时白底（去透明）</b>：导出的 PNG 去除 alpha 并加白底。</li>
+            <li><b>导出时白底（去透明）</b>：导出的图片去除 alpha 并加白底。</li>
+            <li><b>导出格式 / 质量</b>：PNG（压缩级别 0-9）、JPEG 与 WebP（质量 1-100）或无损 WebP（压缩力度 0-100）；编码在后台线程池中并行。</li>
+            <li><b>提取方式</b>：
+              <ul>
+                <li>「内嵌图片（XObject）」：导出原图，配置中记录 <code>xref</code> 及原图尺寸/摘要，供「原位替换」使用。</li>
+                <li>「区域渲染」：找出内联图片、矢量图形（如矢量 Logo）与渐变（如印章）所在区域，按<b>渲染 DPI</b> 只裁剪渲染这些矩形，各页在多个进程中并行；生成 <code>&lt;PDF文件名&gt;_regions_config.json</code>，区域内的文字也会一并渲染。</li>
+              </ul>
+            </li>
           </ul>
 
           <h3>② 页签「批量插入」</h3>
@@ -930,33 +2188,240 @@ class TabUsage(QWidget):
             <li><b>处理目录 / 浏览…</b>：选择包含待处理 PDF 的根目录；选择后如输出目录为空或未被用户修改，自动填为 <code>&lt;处理目录&gt;/output</code>。</li>
             <li><b>输出目录 / 浏览…</b>：保存处理结果的根目录；程序自动按相对路径创建子目录。</li>
             <li><b>文件名添加后缀 _signed</b>：若勾选，输出 PDF 会在文件名后附加 <code>_signed</code>。</li>
+            <li><b>规则表格 · 页</b>：单个页码或 <code>last</code>，也可写页集合 <code>all</code> / <code>odd</code> / <code>even</code> / <code>last-N</code> / <code>1,3-5</code>（可逗号混写）；同一规则在每个文档中只嵌入一份图片。写法无法识别时该文件记为失败。</li>
+            <li><b>图片路径</b>：除 PNG/JPEG/BMP/TIFF 外也可选矢量 PDF（印章、签名），按矢量叠加不栅格化；配置中 <code>src_page</code> 指定源页。</li>
+            <li><b>预览 PDF / 预览页</b>：选择样例 PDF 后在右侧低分辨率显示所选页，并实时叠加各规则的放置矩形；批量处理期间暂停渲染。</li>
+            <li><b>插入方式</b>：「叠加插入」或「原位替换（按 xref）」——按提取配置记录的 <code>xref</code> 直接替换原图，所有引用页同时生效；原图尺寸/内容与提取时不一致的规则改为叠加。</li>
+            <li><b>逐文件清单</b>：<code>.csv</code> / <code>.jsonl</code>，每行用 <code>pdf</code>（相对处理目录）指定文件，并可覆盖图片与坐标，实现每个 PDF 盖不同的章。</li>
+            <li><b>处理前预检</b>：先检查规则图片、各 PDF 能否打开/解密、页码是否越界，并报告预计工作量；图片不可用时整批终止。</li>
+            <li><b>写入结果清单</b>：在输出目录生成 <code>manifest.jsonl</code>，逐行记录每个 PDF 的状态、错误类型、页数、字节数与耗时。</li>
             <li><b>开始处理</b>：后台线程执行；进度条与日志实时刷新；完成后可一键打开输出目录。</li>
           </ul>
+
+          <h3>③ 命令行</h3>
+          <ul>
+            <li>第一个参数为子命令时不启动界面：<code>insert</code>（支持 <code>--shard i/N</code> 多机分片）、<code>preflight</code>、<code>merge</code>（合并分片清单）、<code>extract</code>（<code>--mode regions --dpi 300</code>）、<code>bench-extract</code>；<code>-h</code> 查看全部参数。</li>
+          </ul>
         </body>
         </html>
         """
         return html
 
 # ========= 主窗口 =========
+class LazyTab(QWidget):
+    """页签占位：首次显示时才构建真正的页签控件"""
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+        self._widget: Optional[QWidget] = None
+        self._lay = QVBoxLayout(self); self._lay.setContentsMargins(0, 0, 0, 0)
+
+    def widget(self) -> QWidget:
+        if self._widget is None:
+            self._widget = self._factory()
+            self._lay.addWidget(self._widget)
+        return self._widget
+
+    def showEvent(self, event):
+        self.widget()
+        super().showEvent(event)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle(APP_TITLE); self.resize(1220, 780)
         self.setWindowIcon(QIcon(resource_path("pdf_toolbox.ico")))
-        tabs = QTabWidget()
-        self.tab_insert = TabInsert()
-        self.tab_extract = TabExtract()
-        self.tab_usage  = TabUsage()
-        self.tab_about  = TabAbout()
+        self.tabs = tabs = QTabWidget()
+        self.tab_insert = LazyTab(TabInsert)
+        self.tab_extract = LazyTab(TabExtract)
+        self.tab_usage  = LazyTab(TabUsage)
+        self.tab_about  = LazyTab(TabAbout)
         tabs.addTab(self.tab_extract, "从PDF提取配置")
         tabs.addTab(self.tab_insert, "批量插入")
         tabs.addTab(self.tab_usage,  "使用说明")
         tabs.addTab(self.tab_about,  "关于")
+        self.tab_extract.widget()  # 首个页签立即构建，其余首次切换时构建
         self.setCentralWidget(tabs)
 
+# ========= 启动计时（--measure-startup） =========
+def _preload_fitz(marks: Dict[str, float]):
+    t0 = time.perf_counter()
+    try: fitz._load()
+    except Exception: pass
+    marks["fitz_import"] = time.perf_counter() - t0
+
+def report_startup(app: QApplication, w: MainWindow, marks: Dict[str, float], fitz_thread: threading.Thread):
+    """事件循环首次空闲时调用：补测其余页签构建与 fitz 导入耗时，输出一行 JSON 后退出"""
+    marks["first_idle"] = time.perf_counter() - _T_START
+    for name in ("tab_insert", "tab_usage", "tab_about"):
+        t0 = time.perf_counter(); getattr(w, name).widget()
+        marks[f"build_{name}"] = time.perf_counter() - t0
+    fitz_thread.join()
+    print(json.dumps({k: round(v * 1000, 1) for k, v in marks.items()}, ensure_ascii=False))  # 单位 ms
+    app.quit()
+
+# ========= 命令行（无界面批处理） =========
+def load_insert_config(fn: str) -> Dict[str, Any]:
+    """读取插入配置 JSON；规则中的图片路径按配置文件所在目录解析为绝对路径"""
+    with open(fn, "r", encoding="utf-8") as f: cfg = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(fn))
+    unit = cfg.get("unit", "cm")
+    cfg["unit"] = unit if unit in ("cm", "pt", "inch") else "cm"
+    if cfg.get("y_origin") not in Y_ORIGINS: cfg["y_origin"] = Y_ORIGINS[0]
+    rules = []
+    for rule in cfg.get("rules", []):
+        r2 = dict(rule); r2["image"] = resolve_posix_from_config(base_dir, rule.get("image", ""))
+        r2.setdefault("page", "last"); r2.setdefault("scale_x", 100.0); r2.setdefault("scale_y", 100.0)
+        rules.append(r2)
+    cfg["rules"] = rules
+    return cfg
+
+CLI_COMMANDS = ("insert", "preflight", "merge", "extract", "bench-extract")
+
+def run_cli(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(prog="pdf_image_toolbox", description=f"{APP_TITLE} {APP_VERSION} 命令行模式")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ap_ins = sub.add_parser("insert", help="按配置批量插入图片")
+    ap_pf = sub.add_parser("preflight", help="只做预检：报告不可用的图片/PDF、越界页码与预计工作量")
+    for p in (ap_ins, ap_pf):
+        p.add_argument("--config", required=True, help="插入配置 JSON")
+        p.add_argument("--root", required=True, help="处理目录")
+        p.add_argument("--out", default="", help="输出目录（默认取配置 output_dir，否则 <root>/output）")
+        p.add_argument("--jobs", default="", help="逐文件清单（.csv/.jsonl）：为每个 PDF 指定图片与规则覆盖")
+        p.add_argument("--shard", default="", help="只处理第 i 个分片，格式 i/N（i 从 1 开始）")
+    ap_ins.add_argument("--mode", choices=tuple(INSERT_MODES), default=None,
+                        help="overlay=叠加插入，replace=按 xref 原位替换（默认取配置 insert_mode）")
+    ap_ins.add_argument("--manifest", default="", help="结果清单路径（默认 <out>/manifest[.shard-i-of-N].jsonl）")
+    ap_ins.add_argument("--no-preflight", action="store_true", help="跳过处理前的预检")
+    ap_ins.add_argument("--image-max-px", type=int, default=None,
+                        help="规则图片长边上限（像素），超出则降采样后嵌入；默认取配置 image_max_px，0 表示不限")
+    ap_ins.add_argument("--image-cache", default=IMAGE_CACHE_DIR, help="预处理图片的磁盘缓存目录")
+    ap_ins.add_argument("--no-image-cache", action="store_true", help="不使用磁盘图片缓存")
+
+    ap_mg = sub.add_parser("merge", help="合并各分片的结果清单")
+    ap_mg.add_argument("manifests", nargs="+", help="清单文件，或包含 manifest.shard-*.jsonl 的目录")
+    ap_mg.add_argument("-o", "--output", default="", help="合并后的清单（默认 <首个目录>/manifest.jsonl）")
+
+    def add_extract_args(p: argparse.ArgumentParser):
+        p.add_argument("pdf", help="要扫描的 PDF")
+        p.add_argument("--pages", default="", help="页码，如 1,3-5（默认全部）")
+        p.add_argument("--unit", choices=("cm", "pt", "inch"), default="cm")
+        p.add_argument("--origin", choices=("bottom", "top"), default="bottom",
+                       help="Y 坐标基准：bottom=从下往上（PDF 标准），top=从上往下")
+        p.add_argument("--flatten", action="store_true", help="导出时白底（去透明）")
+
+    ap_ex = sub.add_parser("extract", help="导出 PDF 内嵌图片（或区域渲染）并生成配置")
+    add_extract_args(ap_ex)
+    ap_ex.add_argument("--mode", choices=tuple(EXTRACT_MODES), default="xobject",
+                       help="xobject=导出内嵌图片，regions=按区域渲染内联图片/矢量图形/渐变")
+    ap_ex.add_argument("--dpi", type=int, default=REGION_DPI, help="区域渲染分辨率（仅 --mode regions）")
+    ap_ex.add_argument("--workers", type=int, default=REGION_WORKERS, help="区域渲染进程数（仅 --mode regions）")
+    ap_ex.add_argument("--out", default="", help="导出根目录（默认 <PDF同目录>/pic）")
+    ap_ex.add_argument("--format", choices=tuple(EXPORT_FORMATS), default="png")
+    ap_ex.add_argument("--quality", type=int, default=None, help="PNG 压缩级别 0-9，JPEG/WebP 质量 1-100")
+
+    ap_bx = sub.add_parser("bench-extract", help="比较各导出格式的耗时与体积")
+    add_extract_args(ap_bx)
+    ap_bx.add_argument("--formats", default=",".join(EXPORT_FORMATS), help="逗号分隔的格式列表")
+    ap_bx.add_argument("--workers", type=int, default=ENCODE_WORKERS, help="编码线程数")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "extract":
+        out_root = os.path.abspath(args.out or os.path.join(os.path.dirname(os.path.abspath(args.pdf)), "pic"))
+        ex_args = (args.pdf, out_root, args.unit, args.origin == "bottom", args.pages,
+                   args.flatten, args.format, args.quality)
+        try:
+            if args.mode == "regions":
+                extract_regions(*ex_args, dpi=args.dpi, workers=args.workers)
+            else:
+                extract_images(*ex_args)
+        except Exception as e:
+            print(f"⚠️ {e}", file=sys.stderr); return 1
+        return 0
+
+    if args.cmd == "bench-extract":
+        import tempfile
+        print(f"{'格式':<16}{'图片数':>8}{'耗时(s)':>10}{'总大小(KB)':>14}")
+        for fmt in [f.strip() for f in args.formats.split(",") if f.strip()]:
+            with tempfile.TemporaryDirectory(prefix="pdf-bench-") as tmp:
+                t0 = time.perf_counter()
+                try:
+                    res = extract_images(args.pdf, tmp, args.unit, args.origin == "bottom", args.pages,
+                                         args.flatten, fmt, None, log=lambda _s: None, workers=args.workers,
+                                         manifest_path="")
+                except Exception as e:
+                    print(f"{fmt:<16}⚠️ {e}"); continue
+                dt = time.perf_counter() - t0
+            print(f"{fmt:<16}{res['count']:>8}{dt:>10.2f}{res['bytes'] / 1024:>14.1f}")
+        return 0
+
+    if args.cmd == "merge":
+        paths: List[str] = []
+        for m in args.manifests:
+            paths.extend(sorted(glob.glob(os.path.join(m, "manifest.shard-*.jsonl"))) if os.path.isdir(m) else [m])
+        if not paths: print("未找到任何结果清单", file=sys.stderr); return 2
+        out = args.output or os.path.join(os.path.dirname(os.path.abspath(paths[0])), "manifest.jsonl")
+        summary = merge_manifests(paths, out)
+        print(f"合并 {len(paths)} 个清单：共 {summary['total']}，成功 {summary['ok']}，"
+              f"失败 {summary['fail']}，跳过 {summary['skipped']}")
+        if summary["missing_shards"]: print(f"⚠️ 缺少分片：{', '.join(summary['missing_shards'])}")
+        print(f"合并清单：{summary['output']}")
+        return 0 if summary["fail"] == 0 and summary["skipped"] == 0 and not summary["missing_shards"] else 1
+
+    try:
+        shard = parse_shard(args.shard)
+        cfg = load_insert_config(args.config)
+        jobs = load_stamp_jobs(args.jobs, cfg["rules"]) if args.jobs else None
+    except Exception as e:
+        print(f"参数错误：{e}", file=sys.stderr); return 2
+    if not os.path.isdir(args.root): print(f"处理目录不存在：{args.root}", file=sys.stderr); return 2
+    if not cfg["rules"] and not jobs: print("配置中没有规则", file=sys.stderr); return 2
+
+    out_root = args.out or (cfg.get("output_dir", "") or "").strip() or os.path.join(args.root, "output")
+    out_root_abs = os.path.abspath(out_root)
+
+    _app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    if args.cmd == "preflight":
+        worker = InsertWorker(args.root, out_root_abs, False, cfg["rules"], cfg["unit"], cfg["y_origin"],
+                              shard=shard, jobs=jobs)
+        worker.log.connect(print)
+        rep = worker.run_preflight(worker.collect_pdfs()[0])
+        return 0 if not rep["bad_images"] and not rep["bad_files"] else 1
+
+    ensure_dir(out_root_abs)
+    manifest_path = args.manifest or os.path.join(out_root_abs, manifest_name(shard))
+    worker = InsertWorker(args.root, out_root_abs, bool(cfg.get("add_suffix", False)), cfg["rules"],
+                          cfg["unit"], cfg["y_origin"], shard=shard, manifest_path=manifest_path, jobs=jobs,
+                          mode=args.mode or cfg.get("insert_mode", "overlay"), check_first=not args.no_preflight,
+                          image_max_px=args.image_max_px if args.image_max_px is not None
+                          else int(as_float(cfg.get("image_max_px", 0))),
+                          image_cache_dir=None if args.no_image_cache else args.image_cache)
+    worker.log.connect(print)
+    result: Dict[str, int] = {}
+    worker.finished.connect(lambda ok, fail, _out: result.update(ok=ok, fail=fail))
+    worker.run()
+    return 0 if result.get("fail", 1) == 0 else 1
+
 def main():
+    multiprocessing.freeze_support()  # 打包为 exe 后，区域渲染的子进程由此进入
+    measure = "--measure-startup" in sys.argv
+    if measure: sys.argv.remove("--measure-startup")
+    # 只有第一个参数是子命令（或查看帮助）时才进入命令行模式；
+    # 其他参数（Qt 的 -style 等、拖到 exe 上的文件）照旧交给 QApplication 启动界面
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS + ("-h", "--help"):
+        sys.exit(run_cli(sys.argv[1:]))
+    marks: Dict[str, float] = {"module_import": _T_IMPORTED - _T_START}
     app = QApplication(sys.argv)
+    marks["qapplication"] = time.perf_counter() - _T_START
     w = MainWindow(); w.show()
+    marks["window_shown"] = time.perf_counter() - _T_START
+    # 窗口显示后再在后台导入 PyMuPDF，首次提取/插入时通常已就绪
+    fitz_thread = threading.Thread(target=_preload_fitz, args=(marks,), name="fitz-preload", daemon=True)
+    fitz_thread.start()
+    if measure:
+        QTimer.singleShot(0, lambda: report_startup(app, w, marks, fitz_thread))
     sys.exit(app.exec_())
 
 if __name__ == "__main__":